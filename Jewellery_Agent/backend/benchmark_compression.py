@@ -0,0 +1,165 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from src.embedding_cache import encode_colpali_query
+from src.multivector_compression import COMPRESSED_VECTOR, MEAN_VECTOR, vector_memory_bytes
+
+DEFAULT_QUERIES = [
+    "which diamond is very sparkling",
+    "how to choose a diamond cut",
+    "difference between white gold and platinum",
+    "what is a halo setting",
+    "how to measure ring size",
+    "diamond clarity grades explained",
+    "lab grown versus natural diamonds",
+    "best metal for sensitive skin",
+    "what does carat weight mean",
+    "how to take care of pearls",
+]
+
+
+def compressed_quantization(client, collection_name):
+    params = client.get_collection(collection_name).config.params.vectors
+    if COMPRESSED_VECTOR not in params:
+        raise SystemExit(f"Collection '{collection_name}' has no '{COMPRESSED_VECTOR}' vector: "
+                         f"re-ingest with `documents_db_building.py --sync <dir> --pool-factor N`.")
+
+    config = params[COMPRESSED_VECTOR].quantization_config
+    if isinstance(config, models.ScalarQuantization):
+        return "scalar"
+    if isinstance(config, models.BinaryQuantization):
+        return "binary"
+    return "none"
+
+
+def memory_report(client, collection_name, quantization):
+    """
+    Vectors stored per page for the original and the compressed representation,
+    their size, and what the collection actually keeps in RAM (on_disk vectors
+    are left to the page cache) against an uncompressed collection.
+    """
+    vectors = client.get_collection(collection_name).config.params.vectors
+    pages = original = compressed = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=32,
+            offset=offset,
+            with_payload=False,
+            with_vectors=["colpali", COMPRESSED_VECTOR]
+        )
+        for point in points:
+            pages += 1
+            original += len(point.vector["colpali"])
+            compressed += len(point.vector.get(COMPRESSED_VECTOR) or [])
+        if offset is None:
+            break
+
+    original_mb = vector_memory_bytes(original, 128) / 2**20
+    compressed_mb = vector_memory_bytes(compressed, 128, quantization) / 2**20
+    mean_mb = vector_memory_bytes(pages, 128) / 2**20 if MEAN_VECTOR in vectors else 0.0
+
+    # a quantized vector keeps its quantized copy in RAM whatever its on_disk flag
+    ram_mb = {
+        "colpali": 0.0 if vectors["colpali"].on_disk else original_mb,
+        COMPRESSED_VECTOR: compressed_mb if quantization != "none" or not vectors[COMPRESSED_VECTOR].on_disk else 0.0,
+        MEAN_VECTOR: mean_mb,
+    }
+    uncompressed_ram_mb = original_mb + mean_mb
+    resident_mb = sum(ram_mb.values())
+    return {
+        "pages": pages,
+        "vectors_per_page": round(original / pages, 1) if pages else 0,
+        "compressed_vectors_per_page": round(compressed / pages, 1) if pages else 0,
+        "quantization": quantization,
+        "colpali_on_disk": bool(vectors["colpali"].on_disk),
+        "original_mb": round(original_mb, 2),
+        "compressed_mb": round(compressed_mb, 2),
+        "ram_mb": {name: round(mb, 2) for name, mb in ram_mb.items()},
+        "uncompressed_ram_mb": round(uncompressed_ram_mb, 2),
+        "memory_saved": round(1 - resident_mb / uncompressed_ram_mb, 4) if uncompressed_ram_mb else 0.0,
+    }
+
+
+def search(client, collection_name, query, using, limit, rescore=None):
+    search_params = None
+    if rescore is not None:
+        search_params = models.SearchParams(
+            quantization=models.QuantizationSearchParams(rescore=rescore))
+
+    start = time.perf_counter()
+    points = client.query_points(
+        collection_name=collection_name,
+        query=query,
+        using=using,
+        limit=limit,
+        search_params=search_params,
+        with_payload=False
+    ).points
+    return [point.id for point in points], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=f"Recall / latency / memory of '{COMPRESSED_VECTOR}' against the full 'colpali' vectors")
+    parser.add_argument("--collection", default="guide_documents")
+    parser.add_argument("--queries", default=None, help="Text file with one query per line")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    client = QdrantClient(url="http://localhost:6333")
+    quantization = compressed_quantization(client, args.collection)
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    variants = {"compressed": False}
+    if quantization != "none":
+        # quantized candidates rescored with the pooled full-precision vectors
+        variants["compressed_rescored"] = True
+
+    limit = max(args.k)
+    latencies = {"colpali": [], **{name: [] for name in variants}}
+    recalls = {name: {k: [] for k in args.k} for name in variants}
+
+    for query_text in queries:
+        query = encode_colpali_query(query_text).astype(np.float32).tolist()
+
+        baseline, seconds = search(client, args.collection, query, "colpali", limit)
+        latencies["colpali"].append(seconds)
+
+        for name, rescore in variants.items():
+            ids, seconds = search(client, args.collection, query, COMPRESSED_VECTOR, limit,
+                                  rescore if quantization != "none" else None)
+            latencies[name].append(seconds)
+            for k in args.k:
+                expected = set(baseline[:k])
+                if expected:
+                    recalls[name][k].append(len(expected & set(ids[:k])) / len(expected))
+
+    report = {
+        "queries": len(queries),
+        "memory": memory_report(client, args.collection, quantization),
+        "mean_latency_ms": {name: round(1000 * float(np.mean(values)), 2) for name, values in latencies.items()},
+        "recall_at_k": {name: {k: round(float(np.mean(values)), 4) if values else None
+                               for k, values in by_k.items()}
+                        for name, by_k in recalls.items()},
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+import numpy as np
+
+from benchmark_compression import DEFAULT_QUERIES
+from src import settings
+from src.page_index import build_page_index
+
+
+def encode_queries(model_name, queries):
+    """
+    Runs in a fresh process so load time and memory belong to this encoder alone.
+    """
+    import torch
+    from src.model_registry import get_model, model_stats
+
+    model, processor = get_model(model_name)
+
+    def encode(query):
+        with torch.no_grad():
+            batch_query = processor.process_queries([query]).to(model.device)
+            return model(**batch_query)[0].cpu().float().numpy()
+
+    # first call pays one-off allocations
+    encode(queries[0])
+
+    embeddings, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.append(encode(query))
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "model": model_name,
+        "embeddings": embeddings,
+        "load": model_stats()["models"][model_name],
+        "mean_latency_ms": round(1000 * float(np.mean(latencies)), 1),
+        "p95_latency_ms": round(1000 * float(np.percentile(latencies, 95)), 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def token_cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.mean(np.sum(a * b, axis=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ranking parity, latency and memory of the int8 ColPali query encoder against float32 (CPU)")
+    parser.add_argument("--collection", default="guide_documents")
+    parser.add_argument("--backend", choices=["qdrant", "local"], default=settings.GUIDE_INDEX_BACKEND)
+    parser.add_argument("--queries", default=None, help="Text file with one query per line")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit non-zero unless top-1 and recall@k are identical for every query")
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    # one model per process, one process at a time, so peak RSS is not shared
+    context = multiprocessing.get_context("spawn")
+    runs = {}
+    for model_name in ("colpali", "colpali_int8"):
+        with context.Pool(1) as pool:
+            runs[model_name] = pool.apply(encode_queries, (model_name, queries))
+
+    index = build_page_index(args.collection, args.backend)
+    same_ranking = same_top1 = 0
+    recalls, cosines = [], []
+    for reference, quantized in zip(runs["colpali"]["embeddings"], runs["colpali_int8"]["embeddings"]):
+        expected = [(hit["source"], hit["page_num"]) for hit in index.search(reference, args.k)]
+        found = [(hit["source"], hit["page_num"]) for hit in index.search(quantized, args.k)]
+
+        same_ranking += expected == found
+        same_top1 += expected[:1] == found[:1]
+        if expected:
+            recalls.append(len(set(expected) & set(found)) / len(expected))
+        cosines.append(token_cosine(reference, quantized))
+
+    report = {
+        "queries": len(queries),
+        "k": args.k,
+        "identical_ranking": round(same_ranking / len(queries), 4),
+        "identical_top1": round(same_top1 / len(queries), 4),
+        f"recall_at_{args.k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        "mean_token_cosine": round(float(np.mean(cosines)), 5),
+        "encoders": {name: {key: value for key, value in run.items() if key != "embeddings"}
+                     for name, run in runs.items()},
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.check:
+        recall = report[f"recall_at_{args.k}"]
+        if report["identical_top1"] < 1 or recall is None or recall < 1:
+            print(f"Ranking parity check failed: identical_top1={report['identical_top1']}, "
+                  f"recall_at_{args.k}={recall}")
+            sys.exit(1)
+        print("Ranking parity check passed.")
+
+
+if __name__ == "__main__":
+    main()
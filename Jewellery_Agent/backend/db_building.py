@@ -1,83 +1,279 @@
+import argparse
 import chromadb
 import pandas as pd
 import requests
 import ast
 import time
 
-from sentence_transformers import SentenceTransformer
 from PIL import Image
 from io import BytesIO
-from langchain_google_genai import ChatGoogleGenerativeAI
-from pydantic import BaseModel, Field
-from typing import Optional
+from src.model_registry import get_clip_model
+from src.llm_cache import get_chat_model
+from src.caption_cache import precompute_catalog_caption
+from src.attribute_extraction import (
+    BatchAttributeExtractor,
+    HeuristicExtractor,
+    JewelleryMetaData,
+    LLMExtractor,
+)
+from src.ingest_manifest import IngestManifest, content_hash
 
+MANIFEST_KIND = "catalog_row"
+# stored instead of the row hash when a row was only partly ingested: never
+# equal to a real hash, so the next run picks the row up again
+RETRY_HASH = ""
 
-class JewelleryMetaData(BaseModel):
-    material: Optional[str] = Field(
-        description="The primary metal material, e.g. rose gold, Platinum, Yellow Gold")
-    style: Optional[str] = Field(
-        description="The artistic style, e.g., Vintage, Modern, Solitaire")
-    gemstone: Optional[str] = Field(
-        description="The main stone, e.g., Diamond, Sapphire")
 
+def product_key(row):
+    # stable across catalog refreshes, unlike the row position in the CSV
+    return content_hash(row["url"])[:16]
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash", api_key="")
-structured_llm = llm.with_structured_output(JewelleryMetaData)
 
-model = SentenceTransformer("clip-ViT-B-32")
-client = chromadb.PersistentClient(path="./blue_nile_agentic_db")
+def catalog_rows(df):
+    """
+    [(product_id, row)] in CSV order; a product listed twice is kept once.
+    """
+    rows = {}
+    for _, row in df.iterrows():
+        product_id = product_key(row)
+        if product_id in rows:
+            print(f"Skipping duplicate catalog row for {row['url']}")
+            continue
+        rows[product_id] = row
+    return list(rows.items())
 
-product_collection = client.get_or_create_collection(name="product_knowledge")
-visual_collection = client.get_or_create_collection(name="visual_index")
-
-df = pd.read_csv("blue_nile.csv")
-df.drop("Unnamed: 0", axis=1, inplace=True)
-
-for index, row in df.iterrows():
-    product_id = str(index)
 
+def row_text(row):
     raw_text = ""
     for name, value in row.items():
         if "url" not in name:
             raw_text += f"{name}: {value}. "
+    return raw_text
+
 
-    extracted_data = structured_llm.invoke(raw_text)
+def extraction_text_hash(row):
+    # attributes do not depend on the price, a price change alone is not re-extracted
+    return content_hash(row_text(row.drop(labels=["price"], errors="ignore")))
 
-    metadata_dict = {
-        "product_id": product_id,
+
+def visual_metadata(product_id, row, image_url, image_idx):
+    return {
+        "parent_id": product_id,
         "name": row["name"],
-        "price": float(row["price"]),
-        "material": extracted_data.material or "Unknown",
-        "style": extracted_data.style or "Unknown",
-        "gemstone": extracted_data.gemstone or "Unknown"
+        "price": row["price"],
+        "url": row["url"],
+        "image_url": image_url,
+        "view_index": image_idx
     }
 
-    product_collection.add(
-        ids=[product_id],
-        documents=[raw_text],
-        metadatas=[metadata_dict]
-    )
 
+def ingest_images(product_id, row, model, visual_collection, previous_images=None):
+    """
+    Embeds the images of a row whose URL changed, only refreshes the metadata
+    of unchanged ones and deletes views the row no longer has.
+    Returns ({view_index: url hash} for the manifest, number of views that
+    could not be downloaded or embedded); failed views are left out of the
+    hashes so the next run tries them again.
+    """
+    previous_images = previous_images or {}
     image_urls = ast.literal_eval(row["image_url"])
+    image_hashes = {}
+    failed_views = 0
 
     for image_idx, image_url in enumerate(image_urls):
-        response = requests.get(image_url, stream=True, timeout=10)
-        image = Image.open(BytesIO(response.content))
-        vector = model.encode(image).tolist()
+        image_id = f"{product_id}_{image_idx}"
+        url_hash = content_hash(image_url)
+
+        if previous_images.get(str(image_idx)) == url_hash:
+            visual_collection.update(
+                ids=[image_id],
+                metadatas=[visual_metadata(product_id, row, image_url, image_idx)])
+            image_hashes[str(image_idx)] = url_hash
+            continue
 
-        visual_collection.add(
-            ids=[f"{product_id}_{image_idx}"],
+        try:
+            response = requests.get(image_url, stream=True, timeout=10)
+            response.raise_for_status()
+            image = Image.open(BytesIO(response.content))
+            vector = model.encode(image).tolist()
+        except Exception as e:
+            print(f"Image Error ({image_id}, {image_url}): {e}")
+            failed_views += 1
+            continue
+
+        visual_collection.upsert(
+            ids=[image_id],
             embeddings=[vector],
-            metadatas=[{
-                "parent_id": product_id,
-                "name": row["name"],
-                "price": row["price"],
-                "url": row["url"],
-                "image_url": image_url,
-                "view_index": image_idx
-            }]
+            metadatas=[visual_metadata(product_id, row, image_url, image_idx)]
         )
+        image_hashes[str(image_idx)] = url_hash
+
+        # conversation memory captions catalog images from this cache; a
+        # missing caption is filled in lazily when the image shows up in a chat
+        try:
+            precompute_catalog_caption(
+                product_id, image_idx, image_url, response.content,
+                response.headers.get("Content-Type", "image/jpeg"))
+        except Exception as e:
+            print(f"Caption Error ({image_id}): {e}")
+
+    stale_views = [f"{product_id}_{idx}" for idx in previous_images if idx not in image_hashes]
+    if stale_views:
+        visual_collection.delete(ids=stale_views)
+
+    return image_hashes, failed_views
+
+
+def delete_product(product_id, previous, product_collection, visual_collection):
+    product_collection.delete(ids=[product_id])
+    image_ids = [f"{product_id}_{idx}" for idx in (previous["data"] or {}).get("images", {})]
+    if image_ids:
+        visual_collection.delete(ids=image_ids)
+
+
+def build_extractor(args):
+    if args.dry_run:
+        # local stand-in, exercises batching / concurrency without API calls
+        extractor = HeuristicExtractor(latency=args.dry_run_latency)
+    else:
+        extractor = LLMExtractor(get_chat_model(api_key=""))
+
+    return BatchAttributeExtractor(
+        extractor,
+        batch_size=args.batch_size,
+        max_concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        max_retries=args.retries,
+        stats_path=args.stats_path
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the product / visual Chroma collections from blue_nile.csv")
+    parser.add_argument("--csv", default="blue_nile.csv")
+    parser.add_argument("--db-path", default="./blue_nile_agentic_db")
+    parser.add_argument("--limit", type=int, default=None, help="Only ingest the first N rows")
+    parser.add_argument("--manifest", default="./cache/catalog_manifest.sqlite3",
+                        help="Progress / content-hash manifest used to skip unchanged rows and resume")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-ingest every row")
+    parser.add_argument("--chunk-size", type=int, default=200,
+                        help="Rows extracted and written between manifest commits")
+    parser.add_argument("--batch-size", type=int, default=20, help="Catalog rows per extraction call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Extraction calls in flight")
+    parser.add_argument("--rpm", type=int, default=60, help="Extraction calls per minute")
+    parser.add_argument("--retries", type=int, default=2, help="Per-row retries after a failed batch")
+    parser.add_argument("--stats-path", default=None, help="Append per-batch stats to this JSONL file")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Extract with a local keyword model and do not write to Chroma")
+    parser.add_argument("--dry-run-latency", type=float, default=0.0,
+                        help="Simulated seconds per stand-in model call")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    df = pd.read_csv(args.csv)
+    df.drop("Unnamed: 0", axis=1, inplace=True)
+    if args.limit:
+        df = df.head(args.limit)
+
+    extraction = build_extractor(args)
+
+    catalog = catalog_rows(df)
+
+    if args.dry_run:
+        rows = [(product_id, row_text(row)) for product_id, row in catalog]
+        extraction.run(rows)
+        print(f"Extraction stats: {extraction.summary()}")
+        return
+
+    manifest = IngestManifest(args.manifest)
+    if args.full:
+        manifest.clear(MANIFEST_KIND)
+    previous_rows = manifest.all(MANIFEST_KIND)
+
+    model = get_clip_model()
+    client = chromadb.PersistentClient(path=args.db_path)
+
+    product_collection = client.get_or_create_collection(name="product_knowledge")
+    visual_collection = client.get_or_create_collection(name="visual_index")
+
+    # 1. rows that left the catalog (a --limit run only ever adds / updates)
+    current_ids = {product_id for product_id, _ in catalog}
+    removed = [] if args.limit else [pid for pid in previous_rows if pid not in current_ids]
+    for product_id in removed:
+        delete_product(product_id, previous_rows[product_id], product_collection, visual_collection)
+        manifest.delete(MANIFEST_KIND, product_id)
+
+    # 2. new or changed rows; unchanged ones (and rows finished by an interrupted run) are skipped
+    pending = []
+    for product_id, row in catalog:
+        row_hash = content_hash(row.to_dict())
+        previous = previous_rows.get(product_id)
+        if previous is None or previous["hash"] != row_hash:
+            pending.append((product_id, row, row_hash, previous))
+
+    print(f"Catalog: {len(catalog)} products, {len(pending)} new/changed, {len(removed)} removed, "
+          f"{len(catalog) - len(pending)} unchanged.")
+
+    for start in range(0, len(pending), args.chunk_size):
+        chunk = pending[start: start + args.chunk_size]
+
+        # 3. only rows whose text changed go to the LLM
+        to_extract = []
+        for product_id, row, _, previous in chunk:
+            previous_data = (previous or {}).get("data") or {}
+            if previous_data.get("text_hash") != extraction_text_hash(row):
+                to_extract.append((product_id, row_text(row)))
+        extracted = extraction.run(to_extract) if to_extract else {}
+        failed = {product_id for product_id, _ in to_extract if product_id not in extracted}
+
+        for product_id, row, row_hash, previous in chunk:
+            previous_data = (previous or {}).get("data") or {}
+            if product_id in extracted:
+                attributes = extracted[product_id].model_dump()
+            else:
+                attributes = previous_data.get("attributes") or JewelleryMetaData(
+                    material=None, style=None, gemstone=None).model_dump()
+
+            metadata_dict = {
+                "product_id": product_id,
+                "name": row["name"],
+                "price": float(row["price"]),
+                "material": attributes["material"] or "Unknown",
+                "style": attributes["style"] or "Unknown",
+                "gemstone": attributes["gemstone"] or "Unknown"
+            }
+
+            product_collection.upsert(
+                ids=[product_id],
+                documents=[row_text(row)],
+                metadatas=[metadata_dict]
+            )
+
+            image_hashes, failed_views = ingest_images(
+                product_id, row, model, visual_collection, previous_data.get("images"))
+
+            # committed last: a crash before this line redoes only this row
+            extracted_ok = product_id not in failed
+            if not extracted_ok:
+                # written with the previous (or unknown) attributes, extracted again next run
+                print(f"Extraction failed for {product_id}, will retry on the next run.")
+            if failed_views:
+                print(f"{failed_views} image(s) of {product_id} failed, will retry on the next run.")
+            complete = extracted_ok and not failed_views
+            manifest.put(MANIFEST_KIND, product_id, row_hash if complete else RETRY_HASH, {
+                "text_hash": extraction_text_hash(row) if extracted_ok else None,
+                "attributes": attributes,
+                "images": image_hashes,
+            })
+            print(f"Processed {product_id} items.")
+
+    if extraction.stats:
+        print(f"Extraction stats: {extraction.summary()}")
+    print("Done.")
+
 
-    print(f"Processed {index} items.")
-print("Done.")
+if __name__ == "__main__":
+    main()
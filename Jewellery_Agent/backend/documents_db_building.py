@@ -1,120 +1,441 @@
+import argparse
 import torch
+import hashlib
+import multiprocessing
 import os
+import resource
+import time
 import uuid
 
-from pdf2image import convert_from_path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pdf2image import convert_from_path, pdfinfo_from_path
 from qdrant_client import QdrantClient
-from colpali_engine.models import ColPali, ColPaliProcessor
 from qdrant_client.http import models
+from src.model_registry import get_colpali, get_device
+from src.multivector_compression import (
+    COMPRESSED_VECTOR,
+    MEAN_VECTOR,
+    compressed_vector_params,
+    mean_pool,
+    pool_tokens,
+)
+from src.page_cache import page_cache
+from src.local_index import LocalPageIndex
+from src.page_index import build_page_index
+from src import settings
+
+# fixed namespace: a page of a given PDF version always gets the same point id
+POINT_NAMESPACE = uuid.UUID("6f1d2c1e-3b7a-5c55-9a8e-2f0c4d6b7e31")
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def point_id(pdf_hash, page_num):
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{pdf_hash}:{page_num}"))
+
+
+def document_source(pdf_path):
+    return os.path.basename(pdf_path)[:-4]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
 
 
 class ColPaliRAGDB:
-    def __init__(self, collection_name):
+    def __init__(self, collection_name, pages_per_render=settings.PDF_PAGES_PER_RENDER,
+                 batch_size=settings.PDF_EMBED_BATCH_SIZE, pool_factor=settings.COLPALI_POOL_FACTOR,
+                 quantization=settings.COLPALI_QUANTIZATION, backend=settings.GUIDE_INDEX_BACKEND):
         self.collection_name = collection_name
+        self.pages_per_render = pages_per_render
+        self.batch_size = batch_size
+        # > 1: also store a token-pooled, quantized copy of each page's multivector
+        self.pool_factor = pool_factor
+        self.quantization = quantization
 
-        self.client = QdrantClient(url="http://localhost:6333")
+        # ColPali itself is loaded on the first encode: a sync that hands the
+        # PDFs to worker processes never needs it in the parent
+        self.device = get_device()
 
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = ColPali.from_pretrained(
-            "vidore/colpali-v1.2",
-            dtype=torch.bfloat16 if self.device == "cuda" else torch.float32,
-            device_map=self.device
-        )
-        self.processor = ColPaliProcessor.from_pretrained(
-            "vidore/colpali-v1.2")
+        self.local_index = None
+        self.client = None
+        if backend == "local":
+            # in-process index: full multivectors only, always scored exactly
+            self.local_index = LocalPageIndex(os.path.join(settings.LOCAL_INDEX_DIR, collection_name))
+            self.store_mean = False
+            if self.compress:
+                print("The local index stores full multivectors, ignoring the pool factor.")
+                self.pool_factor = 0
+        else:
+            self.client = QdrantClient(url="http://localhost:6333")
+            self._setup_collection()
 
+    def _setup_collection(self):
         if not self.client.collection_exists(self.collection_name):
+            vectors_config = {
+                # with compression only the pooled, quantized copy stays in RAM
+                "colpali": models.VectorParams(
+                    size=128,
+                    distance=models.Distance.COSINE,
+                    multivector_config=models.MultiVectorConfig(
+                        comparator=models.MultiVectorComparator.MAX_SIM
+                    ),
+                    on_disk=self.compress
+                ),
+                # single-vector prefetch before the MaxSim rerank at query time
+                MEAN_VECTOR: models.VectorParams(
+                    size=128,
+                    distance=models.Distance.COSINE
+                )
+            }
+            if self.compress:
+                vectors_config[COMPRESSED_VECTOR] = compressed_vector_params(128, self.quantization)
+
             self.client.create_collection(
                 collection_name=self.collection_name,
-                vectors_config={
-                    "colpali": models.VectorParams(
-                        size=128,
-                        distance=models.Distance.COSINE,
-                        multivector_config=models.MultiVectorConfig(
-                            comparator=models.MultiVectorComparator.MAX_SIM
-                        )
-                    )
-                }
+                vectors_config=vectors_config
             )
 
-    def ingest_pdf(self, pdf_path):
-        print(f"Processing {pdf_path}...")
-        images = convert_from_path(pdf_path)
-
-        batch_size = 4
-        for i in range(0, len(images), batch_size):
-            batch = images[i: i + batch_size]
-
-            with torch.no_grad():
-                processed_images = self.processor.process_images(
-                    batch).to(self.device)
-                embeddings = self.model(**processed_images)
-
-            points = []
-            for j, img_embedding in enumerate(embeddings):
-                multi_vectors = img_embedding.cpu().float().numpy().tolist()
-                points.append(models.PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector={"colpali": multi_vectors},
-                    payload={"page_num": i + j + 1,
-                             "source": pdf_path.split("/")[-1][:-4]}
-                ))
-
-            self.client.upsert(
+        # named vectors cannot be added to an existing collection
+        vectors = self.client.get_collection(self.collection_name).config.params.vectors
+        if self.compress and COMPRESSED_VECTOR not in vectors:
+            raise ValueError(
+                f"Collection '{self.collection_name}' has no '{COMPRESSED_VECTOR}' vector: "
+                f"delete it and re-run the sync to enable compression.")
+        self.store_mean = MEAN_VECTOR in vectors
+        if not self.store_mean:
+            print(f"Collection '{self.collection_name}' predates '{MEAN_VECTOR}': retrieval stays "
+                  f"single-stage until it is deleted and re-synced.")
+
+        # sync / delete look pages up by document
+        for field in ("source", "pdf_hash"):
+            self.client.create_payload_index(
                 collection_name=self.collection_name,
-                points=points
+                field_name=field,
+                field_schema=models.PayloadSchemaType.KEYWORD
             )
-        print(f"Ingested {len(images)} pages.")
 
+    @property
+    def compress(self):
+        return self.pool_factor > 1
+
+    @staticmethod
+    def _document_filter(source, pdf_hash=None, exclude_hash=None, has_vectors=()):
+        must = [models.FieldCondition(key="source", match=models.MatchValue(value=source))]
+        if pdf_hash:
+            must.append(models.FieldCondition(key="pdf_hash", match=models.MatchValue(value=pdf_hash)))
+        for name in has_vectors:
+            must.append(models.HasVectorCondition(has_vector=name))
+        must_not = []
+        if exclude_hash:
+            must_not.append(models.FieldCondition(key="pdf_hash", match=models.MatchValue(value=exclude_hash)))
+        return models.Filter(must=must, must_not=must_not or None)
+
+    def is_ingested(self, source, pdf_hash, page_count):
+        """
+        True if every page of this exact PDF version is already in the collection
+        (with its mean / compressed vectors, when the collection has them).
+        """
+        if self.local_index:
+            return self.local_index.is_ingested(source, pdf_hash, page_count)
 
-"""
-client = QdrantClient(url="http://localhost:6333")
-client.delete_collection("guide_documents")
+        has_vectors = [name for name, stored in ((MEAN_VECTOR, self.store_mean),
+                                                 (COMPRESSED_VECTOR, self.compress)) if stored]
+        stored = self.client.count(
+            collection_name=self.collection_name,
+            count_filter=self._document_filter(source, pdf_hash, has_vectors=has_vectors),
+            exact=True
+        ).count
+        return stored == page_count
 
-db_builder = ColPaliRAGDB(collection_name="guide_documents")
+    def delete_document(self, source, keep_hash=None):
+        """
+        Deletes the pages of `source`, except those of the version `keep_hash`,
+        from the index and the page cache.
+        """
+        page_cache.delete_document(source, keep_hash)
+        if self.local_index:
+            return self.local_index.delete_document(source, keep_hash)
 
-for pdf_path in os.listdir("./documents"):
-    pdf_path = os.path.join("./documents", pdf_path)
-    db_builder.ingest_pdf(pdf_path)
-"""
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=self._document_filter(source, exclude_hash=keep_hash))
+        )
+
+    def stored_sources(self):
+        if self.local_index:
+            return self.local_index.stored_sources()
+
+        sources = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=256,
+                offset=offset,
+                with_payload=["source"],
+                with_vectors=False
+            )
+            sources.update(point.payload.get("source") for point in points)
+            if offset is None:
+                return sources
+
+    def _render_range(self, pdf_path, pdf_hash, first_page, last_page):
+        images = convert_from_path(pdf_path, dpi=settings.PAGE_RENDER_DPI,
+                                   first_page=first_page, last_page=last_page)
+
+        # keep ready-to-send JPEGs so retrieval never has to rasterize
+        source = document_source(pdf_path)
+        for offset, image in enumerate(images):
+            page_cache.save_page(source, first_page + offset, image, pdf_hash)
+        return images
+
+    def _encode(self, images):
+        model, processor = get_colpali()
+        with torch.no_grad():
+            processed_images = processor.process_images(images).to(self.device)
+            embeddings = model(**processed_images)
+        return [embedding.cpu().float().numpy() for embedding in embeddings]
+
+    def _upsert_pages(self, source, pdf_hash, first_page, vectors):
+        if self.local_index:
+            return self.local_index.upsert_pages(source, pdf_hash, first_page, vectors)
+
+        points = []
+        for j, multi_vectors in enumerate(vectors):
+            page_num = first_page + j
+            vector = {"colpali": multi_vectors.tolist()}
+            if self.store_mean:
+                vector[MEAN_VECTOR] = mean_pool(multi_vectors).tolist()
+            if self.compress:
+                vector[COMPRESSED_VECTOR] = pool_tokens(multi_vectors, self.pool_factor).tolist()
+
+            points.append(models.PointStruct(
+                id=point_id(pdf_hash, page_num),
+                vector=vector,
+                payload={"page_num": page_num,
+                         "source": source,
+                         "pdf_hash": pdf_hash}
+            ))
+
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=points
+        )
+
+    def ingest_pdf(self, pdf_path, pdf_hash=None, page_count=None):
+        """
+        Streams a PDF through render -> encode -> upsert, `pages_per_render`
+        pages at a time. The next range renders and the previous batch is
+        upserted while the current batch encodes, so at most two ranges of
+        page bitmaps are held, whatever the size of the PDF.
+        Returns the throughput / peak memory stats of the run.
+        """
+        print(f"Processing {pdf_path}...")
+        start = time.perf_counter()
+        source = document_source(pdf_path)
+        pdf_hash = pdf_hash or file_hash(pdf_path)
+        page_count = page_count or pdfinfo_from_path(pdf_path)["Pages"]
+        ranges = [(first, min(first + self.pages_per_render - 1, page_count))
+                  for first in range(1, page_count + 1, self.pages_per_render)]
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="render") as renderer, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="upsert") as uploader:
+            rendering = None
+            if ranges:
+                rendering = renderer.submit(self._render_range, pdf_path, pdf_hash, *ranges[0])
+            upserting = None
+
+            for range_idx, (first_page, _) in enumerate(ranges):
+                images = rendering.result()
+                if range_idx + 1 < len(ranges):
+                    rendering = renderer.submit(
+                        self._render_range, pdf_path, pdf_hash, *ranges[range_idx + 1])
+
+                for i in range(0, len(images), self.batch_size):
+                    vectors = self._encode(images[i: i + self.batch_size])
+
+                    # one upsert (and token pooling) in flight: the next batch waits for the last one
+                    if upserting is not None:
+                        upserting.result()
+                    upserting = uploader.submit(
+                        self._upsert_pages, source, pdf_hash, first_page + i, vectors)
+
+            if upserting is not None:
+                upserting.result()
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            "source": source,
+            "pages": page_count,
+            "seconds": round(elapsed, 2),
+            "pages_per_second": round(page_count / elapsed, 2) if elapsed else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        print(f"Ingested {stats}")
+        return stats
+
+    def sync_directory(self, documents_dir, workers=settings.PDF_INGEST_WORKERS):
+        """
+        Brings the collection in line with the PDFs in `documents_dir`:
+        unchanged PDFs are skipped, changed ones re-ingested (their old pages
+        removed afterwards) and pages of deleted PDFs dropped.
+        With `workers` > 1 the PDFs are ingested by a process pool, each
+        worker loading its own ColPali (CPU boxes; keep 1 on a single GPU).
+        The local index has a single writer, so it always ingests in-process.
+        """
+        if self.local_index:
+            workers = 1
+
+        start = time.perf_counter()
+        local_sources = set()
+        to_ingest = []
+        for name in sorted(os.listdir(documents_dir)):
+            if not name.lower().endswith(".pdf"):
+                continue
+            pdf_path = os.path.join(documents_dir, name)
+            source = document_source(pdf_path)
+            local_sources.add(source)
+
+            pdf_hash = file_hash(pdf_path)
+            page_count = pdfinfo_from_path(pdf_path)["Pages"]
+            if self.is_ingested(source, pdf_hash, page_count):
+                print(f"Skipping {pdf_path}: unchanged.")
+                self.delete_document(source, keep_hash=pdf_hash)
+            else:
+                to_ingest.append((pdf_path, pdf_hash, page_count))
+
+        results = []
+        if workers > 1 and len(to_ingest) > 1:
+            workers = min(workers, len(to_ingest))
+            # spawn, not fork: torch and the Qdrant client do not survive a fork
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.collection_name, self.pages_per_render, self.batch_size,
+                              self.pool_factor, self.quantization, workers)
+            ) as pool:
+                futures = {pool.submit(_ingest_in_worker, *job): job for job in to_ingest}
+                for future in as_completed(futures):
+                    pdf_path, pdf_hash, _ = futures[future]
+                    results.append(future.result())
+                    # older versions of the document (and pre-hash uuid4 points)
+                    self.delete_document(document_source(pdf_path), keep_hash=pdf_hash)
+        else:
+            for pdf_path, pdf_hash, page_count in to_ingest:
+                # an interrupted run re-upserts the same ids, no duplicates
+                results.append(self.ingest_pdf(pdf_path, pdf_hash, page_count))
+                self.delete_document(document_source(pdf_path), keep_hash=pdf_hash)
+
+        for source in self.stored_sources() - local_sources:
+            print(f"Removing {source}: no longer in {documents_dir}.")
+            self.delete_document(source)
+
+        if self.local_index:
+            # drop the rows of replaced / removed pages
+            self.local_index.compact()
+
+        elapsed = time.perf_counter() - start
+        pages = sum(stats["pages"] for stats in results)
+        summary = {
+            "ingested_pdfs": len(results),
+            "pages": pages,
+            "seconds": round(elapsed, 2),
+            "pages_per_second": round(pages / elapsed, 2) if elapsed else None,
+            # largest single process (the parent or one worker)
+            "peak_rss_mb": max([peak_rss_mb()] + [stats["peak_rss_mb"] for stats in results]),
+        }
+        print(f"Sync done: {summary}")
+        return summary
+
+
+_worker_db = None
+
+
+def _init_worker(collection_name, pages_per_render, batch_size, pool_factor, quantization, workers):
+    global _worker_db
+    # the workers share the cores instead of each starting one torch thread per core
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+    _worker_db = ColPaliRAGDB(collection_name, pages_per_render=pages_per_render, batch_size=batch_size,
+                              pool_factor=pool_factor, quantization=quantization)
+
+
+def _ingest_in_worker(pdf_path, pdf_hash, page_count):
+    return _worker_db.ingest_pdf(pdf_path, pdf_hash, page_count)
 
 
 COLLECTION_NAME = "guide_documents"
-MODEL_NAME = "vidore/colpali-v1.2"
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-
-print("Connecting to Qdrant (Docker) ...")
-client = QdrantClient(url="http://localhost:6333")
-
-if not client.collection_exists(COLLECTION_NAME):
-    print(f"Error: collection '{COLLECTION_NAME}' not found in Qdrant!")
-    import sys
-    sys.exit()
-
-print("Loading ColPali Model for query embedding ...")
-model = ColPali.from_pretrained(
-    MODEL_NAME,
-    dtype=torch.bfloat16 if DEVICE == "cuda" else torch.float32,
-    device_map=DEVICE
-)
-processor = ColPaliProcessor.from_pretrained(MODEL_NAME)
 
-query_text = "which diamond is very sparkling"
-print(f"Query: '{query_text}'")
 
-with torch.no_grad():
-    batch_query = processor.process_queries([query_text]).to(DEVICE)
-    query_embedding = model(**batch_query)
+def query_demo(query_text, backend=settings.GUIDE_INDEX_BACKEND):
+    if backend != "local":
+        print("Connecting to Qdrant (Docker) ...")
+        client = QdrantClient(url="http://localhost:6333")
+
+        if not client.collection_exists(COLLECTION_NAME):
+            print(f"Error: collection '{COLLECTION_NAME}' not found in Qdrant!")
+            return
+
+    print("Loading ColPali Model for query embedding ...")
+    model, processor = get_colpali()
+
+    print(f"Query: '{query_text}'")
+
+    with torch.no_grad():
+        batch_query = processor.process_queries([query_text]).to(get_device())
+        query_embedding = model(**batch_query)
+
+        multivector = query_embedding[0].cpu().float().numpy()
+
+    results = build_page_index(COLLECTION_NAME, backend).search(multivector, k=3)
+
+    print("Top 3 Retrieve Results:")
+    for i, hit in enumerate(results):
+        print(f"{i + 1}. Score: {hit['score']:.4f} | Page: {hit['page_num']} | Source: {hit['source']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sync the guide PDFs into Qdrant, or run a test query")
+    parser.add_argument("--sync", metavar="DOCUMENTS_DIR", default=None,
+                        help="Ingest new / changed PDFs of this folder and drop removed ones")
+    parser.add_argument("--workers", type=int, default=settings.PDF_INGEST_WORKERS,
+                        help="PDFs ingested in parallel, one process (and ColPali copy) each")
+    parser.add_argument("--pages-per-render", type=int, default=settings.PDF_PAGES_PER_RENDER,
+                        help="Pages rasterized at a time; bounds the page bitmaps held in memory")
+    parser.add_argument("--batch-size", type=int, default=settings.PDF_EMBED_BATCH_SIZE,
+                        help="Pages per ColPali forward pass")
+    parser.add_argument("--pool-factor", type=int, default=settings.COLPALI_POOL_FACTOR,
+                        help=f"Also store '{COMPRESSED_VECTOR}', the page tokens pooled by this factor (0 = off)")
+    parser.add_argument("--quantization", choices=["none", "scalar", "binary"],
+                        default=settings.COLPALI_QUANTIZATION, help=f"Quantization of '{COMPRESSED_VECTOR}'")
+    parser.add_argument("--backend", choices=["qdrant", "local"], default=settings.GUIDE_INDEX_BACKEND,
+                        help="Index synced: the Qdrant collection or the in-process memmap index")
+    parser.add_argument("--query", default="which diamond is very sparkling")
+    return parser.parse_args()
+
 
-    multivector = query_embedding[0].cpu().float().numpy().tolist()
+def main():
+    args = parse_args()
+    if args.sync:
+        db_builder = ColPaliRAGDB(collection_name=COLLECTION_NAME,
+                                  pages_per_render=args.pages_per_render,
+                                  batch_size=args.batch_size,
+                                  pool_factor=args.pool_factor,
+                                  quantization=args.quantization,
+                                  backend=args.backend)
+        db_builder.sync_directory(args.sync, workers=args.workers)
+    else:
+        query_demo(args.query, args.backend)
 
-results = client.query_points(
-    collection_name=COLLECTION_NAME,
-    query=multivector,
-    using="colpali",
-    limit=3
-).points
 
-print("Top 3 Retrieve Results:")
-for i, hit in enumerate(results):
-    print(f"{i + 1}. Score: {hit.score:.4f} | Page: {hit.payload.get('page_num')} | Source: {hit.payload.get('source')}")
+if __name__ == "__main__":
+    main()
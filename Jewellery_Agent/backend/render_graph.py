@@ -0,0 +1,18 @@
+import argparse
+
+from src.graph import agent_graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the agent graph to a mermaid PNG")
+    parser.add_argument("--output", default="agent_graph.png")
+    args = parser.parse_args()
+
+    graph_image = agent_graph.get_graph().draw_mermaid_png()
+    with open(args.output, "wb") as f:
+        f.write(graph_image)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
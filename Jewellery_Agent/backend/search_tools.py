@@ -5,61 +5,43 @@ import base64
 import json
 import torch
 
-from sentence_transformers import SentenceTransformer
 from io import BytesIO
 from PIL import Image
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from pydantic import BaseModel, Field, create_model
 from typing import Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import SystemMessage, HumanMessage
-from qdrant_client import QdrantClient
-from colpali_engine.models import ColPali, ColPaliProcessor
-from pdf2image import convert_from_path
 from typing import List, Dict, Any, Union, Literal
+from src.facet_index import FacetIndex, describe_relaxations
+from src.model_registry import get_clip_model, get_colpali_query_encoder
+from src.embedding_cache import encode_clip_text, encode_colpali_query
+from src.image_fetcher import image_fetcher
+from src.image_server import image_reference
+from src.page_cache import page_cache
+from src.llm_cache import get_chat_model
+from src.page_index import build_page_index
 
 
 class DocumentKnowledgeBase:
     def __init__(self):
-        self.client = QdrantClient(url="http://localhost:6333")
         self.collection_name = "guide_documents"
+        self.index = build_page_index(self.collection_name)
 
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.colpali_model = ColPali.from_pretrained(
-            "vidore/colpali-v1.2",
-            dtype=torch.bfloat16 if self.device == "cuda" else torch.float32,
-            device_map=self.device
-        )
-        self.processor = ColPaliProcessor.from_pretrained(
-            "vidore/colpali-v1.2")
+        self.colpali_model, self.processor = get_colpali_query_encoder()
+        self.device = self.colpali_model.device
 
     def retrieve_context_pages(self, conversation_history, k=3):
-        with torch.no_grad():
-            batch_query = self.processor.process_queries(
-                [conversation_history]).to(self.device)
-            query_embedding = self.colpali_model(**batch_query)
-
-        multivector_query = query_embedding[0].cpu().float().numpy().tolist()
+        multivector_query = encode_colpali_query(
+            conversation_history).astype("float32")
 
-        search_result = self.client.query_points(
-            collection_name=self.collection_name,
-            query=multivector_query,
-            using="colpali",
-            limit=k
-        ).points
+        search_result = self.index.search(multivector_query, k)
 
         context_images = []
-        for point in search_result:
-            pdf_source = point.payload["source"]
-            page_num = point.payload["page_num"]
-
-            pdf_path = f"./documents/{pdf_source}.pdf"
-
-            images = convert_from_path(
-                pdf_path, first_page=page_num, last_page=page_num)
-            if images:
-                context_images.append(images[0])
+        for hit in search_result:
+            page = page_cache.get_page(hit["source"], hit["page_num"], pdf_hash=hit.get("pdf_hash"))
+            if page:
+                context_images.append(page)
         return context_images
 
 
@@ -71,12 +53,13 @@ class BlueNileSearch():
             name="product_knowledge")
         self.visual_collection = client.get_collection(name="visual_index")
 
-        self.model = SentenceTransformer("clip-ViT-B-32")
+        self.model = get_clip_model()
 
         self.document_db = DocumentKnowledgeBase()
 
-        all_metadatas = self.product_collection.get(
-            include=["metadatas"])["metadatas"]
+        all_products = self.product_collection.get(include=["metadatas"])
+        all_metadatas = all_products["metadatas"]
+        self.facet_index = FacetIndex(all_products["ids"], all_metadatas)
         self.material_list = list(
             set([meta.get("material") for meta in all_metadatas]))
         self.style_list = list(set([meta.get("style")
@@ -116,8 +99,7 @@ class BlueNileSearch():
             )),
         )
 
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash", api_key="")
+        self.llm = get_chat_model(api_key="")
         self.structed_llm = self.llm.with_structured_output(self.SearchIntent)
 
     def _rewrite_query(self, history, current_input):
@@ -153,10 +135,8 @@ class BlueNileSearch():
         response = self.llm.invoke(msg)
         return response.content.strip()
 
-    def _get_b64_image(self, image):
-        buffered = BytesIO()
-        image.save(buffered, format="JPEG")
-        return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    def _get_b64_image(self, jpeg_bytes):
+        return base64.b64encode(jpeg_bytes).decode("utf-8")
 
     def agentic_filtering(self, conversation_input):
         # paser input (handle list vs string)
@@ -242,50 +222,24 @@ class BlueNileSearch():
             if (value == "NO REQUIREMENT" or "price" in field_name or "reasoning" in field_name):
                 continue
             else:
-                active_filters[field_name] = {field_name: value}
+                active_filters[field_name] = value
 
-        price_conditions = []
+        price_range = {}
         if (intent.min_price is not None and intent.min_price != "NO REQUIREMENT"):
-            price_conditions.append({"price": {"$gte": intent.min_price}})
+            price_range["min"] = float(intent.min_price)
         if (intent.max_price is not None and intent.max_price != "NO REQUIREMENT"):
-            price_conditions.append({"price": {"$lte": intent.max_price}})
+            price_range["max"] = float(intent.max_price)
 
-        if price_conditions:
-            if len(price_conditions) > 1:
-                active_filters["price"] = {"$and": price_conditions}
-            else:
-                active_filters["price"] = price_conditions[0]
+        if price_range:
+            active_filters["price"] = price_range
 
         print("active filters = {}".format(active_filters))
 
-        all_rules = list(active_filters.values())
-        strict_where = {"$and": all_rules} if len(
-            all_rules) > 1 else all_rules[0]
-
-        results = self.product_collection.get(
-            where=strict_where, include=["metadatas"])
-        valid_ids = results["ids"]
+        valid_ids = self.facet_index.matching_ids(active_filters)
 
         if not valid_ids:
-            diagnosis_lines = []
-
-            for filter_name in active_filters.keys():
-                relaxed_rules = [
-                    rule for k, rule in active_filters.items() if k != filter_name
-                ]
-
-                if not relaxed_rules:
-                    count = self.product_collection.count()
-                else:
-                    relaxed_where = {"$and": relaxed_rules} if len(
-                        relaxed_rules) > 1 else relaxed_rules[0]
-                    count = len(self.product_collection.get(
-                        where=relaxed_where, include=["metadatas"]))
-
-                if count > 0:
-                    diagnosis_lines.append(
-                        f"-Option: Keep everything but change '{filter_name}', we have {count} items.")
-            suggestion = "\n".join(diagnosis_lines)
+            diagnosis = self.facet_index.diagnose_relaxations(active_filters)
+            suggestion = describe_relaxations(diagnosis)
 
             return_str = f"""
             SYSTEM_NOTICE: No exact matches found for the user's query.
@@ -308,7 +262,7 @@ class BlueNileSearch():
             return valid_ids
 
     def agentic_search(self, user_query, valid_ids, top_k=5):
-        query_vector = self.model.encode(user_query).tolist()
+        query_vector = encode_clip_text(user_query).tolist()
 
         fetch_k = top_k * 4
 
@@ -389,21 +343,20 @@ class BlueNileSearch():
         image_gallery = []
         lean_results = []
 
-        for index, item in enumerate(results):
-            image_url = item["image_url"]
-            image_response = requests.get(image_url, stream=True, timeout=20)
-            content_type = image_response.headers.get(
-                "Content-Type", "image/jpg")
-            encoded_image = base64.b64encode(
-                image_response.content).decode("utf-8")
-            image_gallery.append(f"data:{content_type};base64,{encoded_image}")
+        fetched_images = image_fetcher.fetch_many(
+            [item["image_url"] for item in results])
+
+        for item, image in zip(results, fetched_images):
+            if image is None:
+                continue
 
             lean_results.append({
-                "index": index,
+                "index": len(image_gallery),
                 "name": item.get("name"),
                 "price": item.get("price"),
                 "description": item.get("description", "No description")
             })
+            image_gallery.append(image_reference(image))
 
         context_str = json.dumps(lean_results, indent=4)
 
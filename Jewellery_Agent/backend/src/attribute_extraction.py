@@ -0,0 +1,219 @@
+import json
+import re
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class JewelleryMetaData(BaseModel):
+    material: Optional[str] = Field(
+        description="The primary metal material, e.g. rose gold, Platinum, Yellow Gold")
+    style: Optional[str] = Field(
+        description="The artistic style, e.g., Vintage, Modern, Solitaire")
+    gemstone: Optional[str] = Field(
+        description="The main stone, e.g., Diamond, Sapphire")
+
+
+class RowMetaData(JewelleryMetaData):
+    row_id: str = Field(description="The ROW_ID of the catalog row, copied verbatim")
+
+
+class BatchMetaData(BaseModel):
+    items: List[RowMetaData] = Field(
+        description="One entry per catalog row, in any order")
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces calls evenly to stay under `requests_per_minute`.
+    """
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class LLMExtractor:
+    """
+    Extracts attributes for many rows per call with a list-valued schema,
+    or for a single row with the original schema.
+    """
+
+    def __init__(self, llm):
+        self.batch_llm = llm.with_structured_output(BatchMetaData)
+        self.row_llm = llm.with_structured_output(JewelleryMetaData)
+
+    def extract_batch(self, rows):
+        """
+        rows: [(row_id, raw_text)] -> {row_id: JewelleryMetaData}; rows the
+        model skipped are missing from the result.
+        """
+        listing = "\n".join(f"ROW_ID {row_id}: {raw_text}" for row_id, raw_text in rows)
+        prompt = f"""
+        Extract the material, style and gemstone of every jewellery catalog row below.
+        Return exactly one item per ROW_ID and copy the ROW_ID verbatim.
+
+        {listing}
+        """
+        result = self.batch_llm.invoke(prompt)
+
+        wanted = {row_id for row_id, _ in rows}
+        return {
+            item.row_id: JewelleryMetaData(material=item.material, style=item.style, gemstone=item.gemstone)
+            for item in result.items if item.row_id in wanted
+        }
+
+    def extract_row(self, raw_text):
+        return self.row_llm.invoke(raw_text)
+
+
+class HeuristicExtractor:
+    """
+    Local stand-in for the LLM (dry runs): keyword matching on the row text.
+    """
+
+    MATERIALS = ["Rose Gold", "Yellow Gold", "White Gold", "Platinum", "Sterling Silver", "Gold", "Silver"]
+    STYLES = ["Vintage", "Halo", "Solitaire", "Three-Stone", "Pave", "Eternity", "Modern", "Classic"]
+    GEMSTONES = ["Diamond", "Sapphire", "Ruby", "Emerald", "Pearl", "Aquamarine", "Morganite"]
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    @staticmethod
+    def _first_match(options, text):
+        for option in options:
+            if re.search(rf"\b{re.escape(option)}\b", text, re.IGNORECASE):
+                return option
+        return None
+
+    def _match(self, raw_text):
+        return JewelleryMetaData(
+            material=self._first_match(self.MATERIALS, raw_text),
+            style=self._first_match(self.STYLES, raw_text),
+            gemstone=self._first_match(self.GEMSTONES, raw_text))
+
+    # `latency` simulates one model round trip per call
+    def extract_row(self, raw_text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._match(raw_text)
+
+    def extract_batch(self, rows):
+        if self.latency:
+            time.sleep(self.latency)
+        return {row_id: self._match(raw_text) for row_id, raw_text in rows}
+
+
+class BatchAttributeExtractor:
+    """
+    Runs `extractor` over catalog rows in batches of `batch_size`, with up to
+    `max_concurrency` batches in flight under a shared rate limit. Rows a
+    batch call failed on (or skipped) are retried one by one; rows that still
+    fail are left out of the results. Per-batch stats are kept in `self.stats`.
+    """
+
+    def __init__(self, extractor, batch_size=20, max_concurrency=4,
+                 requests_per_minute=60, max_retries=2, stats_path=None):
+        self.extractor = extractor
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(requests_per_minute)
+        self.stats_path = stats_path
+
+        self.stats = []
+        self._stats_lock = threading.Lock()
+
+    def _call(self, fn, *args):
+        self.limiter.acquire()
+        return fn(*args)
+
+    def _retry_row(self, raw_text):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._call(self.extractor.extract_row, raw_text)
+            except Exception as e:
+                print(f"Extraction retry {attempt + 1} failed: {e}")
+                if attempt < self.max_retries:
+                    time.sleep(2 ** attempt)
+        return None
+
+    def _run_batch(self, batch_idx, rows):
+        start = time.perf_counter()
+        try:
+            results = self._call(self.extractor.extract_batch, rows)
+        except Exception as e:
+            print(f"Batch {batch_idx} failed, retrying its rows individually: {e}")
+            results = {}
+
+        retried = failed = 0
+        for row_id, raw_text in rows:
+            if row_id in results:
+                continue
+            retried += 1
+            result = self._retry_row(raw_text)
+            if result is None:
+                failed += 1
+                continue
+            results[row_id] = result
+
+        elapsed = time.perf_counter() - start
+        self._record({
+            "batch": batch_idx,
+            "rows": len(rows),
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(len(rows) / elapsed, 2) if elapsed else None,
+            "retried_rows": retried,
+            "failed_rows": failed,
+        })
+        return results
+
+    def _record(self, entry):
+        print(f"[extraction] {entry}")
+        with self._stats_lock:
+            self.stats.append(entry)
+            if self.stats_path:
+                with open(self.stats_path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    def run(self, rows):
+        """
+        rows: [(row_id, raw_text)] -> {row_id: JewelleryMetaData}; rows whose
+        extraction failed are missing from the result.
+        """
+        batches = [rows[i: i + self.batch_size] for i in range(0, len(rows), self.batch_size)]
+        results = {}
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                thread_name_prefix="extraction") as executor:
+            for batch_results in executor.map(self._run_batch, range(len(batches)), batches):
+                results.update(batch_results)
+
+        elapsed = time.perf_counter() - start
+        print(f"Extracted attributes for {len(results)} rows in {elapsed:.1f}s "
+              f"({len(results) / elapsed if elapsed else 0:.1f} rows/s)")
+        return results
+
+    def summary(self):
+        rows = sum(entry["rows"] for entry in self.stats)
+        seconds = sum(entry["seconds"] for entry in self.stats)
+        return {
+            "batches": len(self.stats),
+            "rows": rows,
+            "retried_rows": sum(entry["retried_rows"] for entry in self.stats),
+            "failed_rows": sum(entry["failed_rows"] for entry in self.stats),
+            "mean_batch_seconds": round(seconds / len(self.stats), 3) if self.stats else 0.0,
+        }
@@ -0,0 +1,195 @@
+import base64
+import hashlib
+import os
+import re
+import threading
+import time
+
+from collections import OrderedDict
+from langchain_core.messages import HumanMessage
+from src import settings
+
+BLOB_REF_PATTERN = re.compile(r"^blob://([0-9a-f]{64})\?type=([\w.+-]+/[\w.+-]+)$")
+DATA_URL_PATTERN = re.compile(r"^data:([\w.+-]+/[\w.+-]+);base64,(.*)$", re.DOTALL)
+# memory hits refresh the file's mtime (what prune() looks at) at most this often
+TOUCH_INTERVAL_SECONDS = 60
+
+
+def is_blob_ref(url):
+    return isinstance(url, str) and BLOB_REF_PATTERN.match(url) is not None
+
+
+class BlobStore:
+    """
+    Content-addressed (sha256) image store. Conversation state keeps short
+    `blob://<sha256>?type=<content type>` references instead of base64 data,
+    which are resolved back to data URLs right before an LLM call.
+    """
+
+    def __init__(self, root, max_memory_items=64):
+        self.root = root
+        self.max_memory_items = max_memory_items
+
+        self._blobs = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, blob_id):
+        return os.path.join(self.root, blob_id[:2], f"{blob_id}.bin")
+
+    def _remember(self, blob_id, content):
+        # callers have just written or touched the file
+        with self._lock:
+            self._blobs[blob_id] = [content, time.time()]
+            self._blobs.move_to_end(blob_id)
+            while len(self._blobs) > self.max_memory_items:
+                self._blobs.popitem(last=False)
+
+    def put(self, content, content_type="image/jpeg"):
+        """
+        Stores `content` (idempotent) and returns its reference.
+        """
+        blob_id = hashlib.sha256(content).hexdigest()
+        path = self._path(blob_id)
+
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        self._remember(blob_id, content)
+        return f"blob://{blob_id}?type={content_type}"
+
+    def get(self, ref):
+        """
+        Returns (content, content_type) for a reference, or None if unknown.
+        """
+        match = BLOB_REF_PATTERN.match(ref)
+        if not match:
+            return None
+        blob_id, content_type = match.groups()
+
+        with self._lock:
+            entry = self._blobs.get(blob_id)
+            if entry is not None:
+                self._blobs.move_to_end(blob_id)
+                stale = time.time() - entry[1] > TOUCH_INTERVAL_SECONDS
+                if stale:
+                    entry[1] = time.time()
+        if entry is not None:
+            # blobs served from memory must not look idle to prune()
+            if stale:
+                try:
+                    os.utime(self._path(blob_id))
+                except OSError:
+                    pass
+            return entry[0], content_type
+
+        path = self._path(blob_id)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+
+        self._remember(blob_id, content)
+        return content, content_type
+
+    def put_data_url(self, url):
+        """
+        Replaces a base64 data URL by a blob reference; other URLs are returned unchanged.
+        """
+        match = DATA_URL_PATTERN.match(url or "")
+        if not match:
+            return url
+        return self.put(base64.b64decode(match.group(2)), match.group(1))
+
+    def to_data_url(self, ref):
+        """
+        Resolves a blob reference to a data URL; anything else is returned unchanged.
+        """
+        if not is_blob_ref(ref):
+            return ref
+
+        loaded = self.get(ref)
+        if loaded is None:
+            print(f"Blob Error: {ref} is missing")
+            return ref
+
+        content, content_type = loaded
+        return f"data:{content_type};base64,{base64.b64encode(content).decode('utf-8')}"
+
+    def prune(self, max_age_seconds):
+        """
+        Deletes blobs not read or written for `max_age_seconds`. Returns the number removed.
+        """
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(folder, name)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+
+        with self._lock:
+            self._blobs.clear()
+        return removed
+
+
+blob_store = BlobStore(
+    root=settings.BLOB_STORE_DIR,
+    max_memory_items=settings.BLOB_STORE_MEMORY_ITEMS
+)
+
+
+def _map_image_urls(message, fn):
+    if not isinstance(message, HumanMessage) or not isinstance(message.content, list):
+        return message
+
+    changed = False
+    content = []
+    for block in message.content:
+        if isinstance(block, dict) and block.get("type") == "image_url":
+            url = block["image_url"]["url"]
+            new_url = fn(url)
+            if new_url is None:
+                changed = True
+                continue
+            if new_url != url:
+                block = {**block, "image_url": {**block["image_url"], "url": new_url}}
+                changed = True
+        content.append(block)
+
+    if not changed:
+        return message
+    return message.model_copy(update={"content": content})
+
+
+def externalize_images(message):
+    """
+    Copy of a user message whose inline (data URL) images are moved to the blob store.
+    """
+    return _map_image_urls(message, blob_store.put_data_url)
+
+
+def _resolve_or_drop(url):
+    url = blob_store.to_data_url(url)
+    # a pruned blob cannot be sent to the model
+    return None if is_blob_ref(url) else url
+
+
+def resolve_images(message):
+    """
+    Copy of a user message whose blob references are turned back into data URLs;
+    images whose blob no longer exists are dropped.
+    """
+    return _map_image_urls(message, _resolve_or_drop)
@@ -0,0 +1,211 @@
+import asyncio
+import base64
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from typing import List
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel, Field
+from src import settings
+from src.blob_store import BLOB_REF_PATTERN, DATA_URL_PATTERN, blob_store
+from src.image_server import LOCAL_IMAGE_PATTERN, resolve_image_reference
+from src.llm_cache import get_chat_model
+
+CAPTION_PROMPT = "Describe the jewelry in each image in 1 short sentence, or say the image is irrelevant."
+
+
+class ImageCaptions(BaseModel):
+    captions: List[str] = Field(
+        description="One short caption per image, in the same order as the images")
+
+
+class CaptionCache:
+    """
+    Persistent image captions. Catalog images are keyed by
+    `catalog:<product_id>:<view_index>` (precomputed at ingestion, stored
+    with the hash of the URL they describe), other images by the sha256 of
+    their bytes, or of their URL for remote images.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS captions (
+                    key TEXT PRIMARY KEY,
+                    caption TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            # caches created before catalog captions recorded their image
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(captions)")]
+            if "source_hash" not in columns:
+                self._conn.execute("ALTER TABLE captions ADD COLUMN source_hash TEXT")
+            # url hash (= image id of the /images endpoint) -> catalog key
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS catalog_images (
+                    image_id TEXT PRIMARY KEY,
+                    catalog_key TEXT NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def catalog_key(product_id, view_index):
+        return f"catalog:{product_id}:{view_index}"
+
+    def register_catalog_image(self, image_url, product_id, view_index):
+        image_id = hashlib.sha256(image_url.encode("utf-8")).hexdigest()
+        catalog_key = self.catalog_key(product_id, view_index)
+        with self._lock, self._conn:
+            # the view's previous URL no longer describes this caption
+            self._conn.execute(
+                "DELETE FROM catalog_images WHERE catalog_key = ? AND image_id != ?",
+                (catalog_key, image_id))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO catalog_images (image_id, catalog_key) VALUES (?, ?)",
+                (image_id, catalog_key))
+
+    def _catalog_alias(self, image_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT catalog_key FROM catalog_images WHERE image_id = ?", (image_id,)).fetchone()
+        return row[0] if row else None
+
+    def key_for(self, url):
+        """
+        Cache key of an image URL (blob reference, data URL, /images reference or remote URL).
+        """
+        match = BLOB_REF_PATTERN.match(url)
+        if match:
+            # blob ids already are content hashes
+            return f"image:{match.group(1)}"
+
+        match = DATA_URL_PATTERN.match(url)
+        if match:
+            return f"image:{hashlib.sha256(base64.b64decode(match.group(2))).hexdigest()}"
+
+        match = LOCAL_IMAGE_PATTERN.search(url)
+        image_id = match.group(1) if match else hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self._catalog_alias(image_id) or f"url:{image_id}"
+
+    def get(self, key, source_hash=None):
+        """
+        With `source_hash`, a caption stored for another source counts as a miss.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT caption, source_hash FROM captions WHERE key = ?", (key,)).fetchone()
+            if row is None or (source_hash is not None and row[1] != source_hash):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, caption, source_hash=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO captions (key, caption, created_at, source_hash) "
+                "VALUES (?, ?, ?, ?)",
+                (key, caption, time.time(), source_hash))
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM captions WHERE key = ?", (key,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+caption_cache = CaptionCache(path=settings.CAPTION_CACHE_PATH)
+
+caption_llm = get_chat_model().with_structured_output(ImageCaptions)
+
+
+def _to_model_url(url):
+    # the VLM needs the bytes: resolve blob and /images references
+    return resolve_image_reference(blob_store.to_data_url(url))
+
+
+def caption_request(urls):
+    content = [{"type": "text", "text": CAPTION_PROMPT}]
+    for url in urls:
+        content.append({"type": "image_url", "image_url": {"url": url}})
+    return [HumanMessage(content=content)]
+
+
+def _lookup(urls):
+    keys = [caption_cache.key_for(url) for url in urls]
+    captions = [caption_cache.get(key) for key in keys]
+    missing = [i for i, caption in enumerate(captions) if caption is None]
+    return keys, captions, missing
+
+
+def _store(keys, captions, missing, result):
+    if len(result.captions) != len(missing):
+        print(f"Caption Error: expected {len(missing)} captions, got {len(result.captions)}")
+        return "; ".join([c for c in captions if c] + list(result.captions))
+
+    for i, caption in zip(missing, result.captions):
+        captions[i] = caption
+        caption_cache.put(keys[i], caption)
+    return "; ".join(captions)
+
+
+def caption_images(urls):
+    """
+    One caption line for a set of images; only the uncached ones go to the VLM, in one call.
+    """
+    keys, captions, missing = _lookup(urls)
+    if not missing:
+        return "; ".join(captions)
+
+    result = caption_llm.invoke(caption_request([_to_model_url(urls[i]) for i in missing]))
+    return _store(keys, captions, missing, result)
+
+
+async def acaption_images(urls):
+    keys, captions, missing = await asyncio.to_thread(_lookup, urls)
+    if not missing:
+        return "; ".join(captions)
+
+    model_urls = await asyncio.to_thread(lambda: [_to_model_url(urls[i]) for i in missing])
+    result = await caption_llm.ainvoke(caption_request(model_urls))
+    return await asyncio.to_thread(_store, keys, captions, missing, result)
+
+
+def precompute_catalog_caption(product_id, view_index, image_url, content, content_type="image/jpeg"):
+    """
+    Ingestion hook: captions a catalog image and maps its URL to the catalog key.
+    The caption is kept until the view's image URL changes.
+    """
+    key = caption_cache.catalog_key(product_id, view_index)
+    url_hash = hashlib.sha256(image_url.encode("utf-8")).hexdigest()
+    caption_cache.register_catalog_image(image_url, product_id, view_index)
+    if caption_cache.get(key, source_hash=url_hash) is not None:
+        return
+    # a failed call below must not leave the old image's caption in place
+    caption_cache.delete(key)
+
+    data_url = f"data:{content_type};base64,{base64.b64encode(content).decode('utf-8')}"
+    result = caption_llm.invoke(caption_request([data_url]))
+    if result.captions:
+        caption_cache.put(key, result.captions[0], source_hash=url_hash)
@@ -0,0 +1,208 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from src import settings
+from src.blob_store import blob_store
+
+
+class PersistentCheckpointer(SqliteSaver):
+    """
+    SqliteSaver for the agent graph, safe to share between worker processes
+    (WAL + busy timeout). On top of the stock saver it:
+      - keeps only the latest `max_history` checkpoints of each thread,
+      - evicts threads idle for longer than `thread_ttl_seconds`,
+      - compacts the file from a background thread,
+      - implements the async API by running the sync calls in worker threads.
+
+    History trimming assumes full-snapshot channels (our AgentState has no
+    DeltaChannel), so the latest checkpoint alone restores a thread.
+    """
+
+    def __init__(self, path, max_history=10, thread_ttl_seconds=7 * 24 * 3600, compact_interval=600):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        super().__init__(sqlite3.connect(path, check_same_thread=False, timeout=30))
+
+        self.path = path
+        self.max_history = max_history
+        self.thread_ttl_seconds = thread_ttl_seconds
+        self.compact_interval = compact_interval
+        self._compactor = None
+
+    def setup(self):
+        if self.is_setup:
+            return
+
+        super().setup()
+        self.conn.executescript("""
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS thread_activity_last_used ON thread_activity(last_used);
+        """)
+        self.conn.commit()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, last_used) VALUES (?, ?)",
+                (thread_id, time.time()))
+            if self.max_history:
+                self._trim_history(cur, thread_id, checkpoint_ns)
+
+        return next_config
+
+    def _trim_history(self, cur, thread_id, checkpoint_ns):
+        # checkpoint ids are time-ordered (uuid6), like SqliteSaver's own "latest" lookup
+        cur.execute("""
+            DELETE FROM checkpoints
+            WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                SELECT checkpoint_id FROM checkpoints
+                WHERE thread_id = ? AND checkpoint_ns = ?
+                ORDER BY checkpoint_id DESC LIMIT ?
+            )
+        """, (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.max_history))
+        if cur.rowcount:
+            cur.execute("""
+                DELETE FROM writes
+                WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                )
+            """, (thread_id, checkpoint_ns, thread_id, checkpoint_ns))
+
+    def delete_thread(self, thread_id):
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    def evict_idle_threads(self, ttl_seconds=None):
+        """
+        Deletes every thread whose last checkpoint is older than the TTL.
+        Returns the number of evicted threads.
+        """
+        cutoff = time.time() - (ttl_seconds or self.thread_ttl_seconds)
+        with self.cursor() as cur:
+            cur.execute("SELECT thread_id FROM thread_activity WHERE last_used < ?", (cutoff,))
+            thread_ids = [row[0] for row in cur.fetchall()]
+
+        for thread_id in thread_ids:
+            self.delete_thread(thread_id)
+        return len(thread_ids)
+
+    def compact(self):
+        """
+        Evicts idle threads (and blobs nobody used for as long), folds the WAL
+        back into the database and VACUUMs when over a quarter of the file is free pages.
+        """
+        evicted = self.evict_idle_threads()
+        pruned_blobs = blob_store.prune(self.thread_ttl_seconds)
+
+        with self.cursor() as cur:
+            cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            page_count = cur.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = cur.execute("PRAGMA freelist_count").fetchone()[0]
+
+        vacuumed = False
+        if page_count and free_pages / page_count > 0.25:
+            with self.cursor() as cur:
+                cur.execute("VACUUM")
+            vacuumed = True
+
+        return {"evicted_threads": evicted, "pruned_blobs": pruned_blobs,
+                "free_pages": free_pages, "vacuumed": vacuumed}
+
+    def start_background_compaction(self):
+        if self._compactor is not None or not self.compact_interval:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.compact_interval)
+                try:
+                    result = self.compact()
+                    if result["evicted_threads"] or result["pruned_blobs"] or result["vacuumed"]:
+                        print(f"Checkpoint compaction: {result}")
+                except Exception as e:
+                    print(f"Checkpoint compaction error: {e}")
+
+        self._compactor = threading.Thread(target=loop, name="checkpoint-compactor", daemon=True)
+        self._compactor.start()
+
+    def thread_stats(self, thread_id=None):
+        """
+        Stored checkpoints / pending writes and their size in bytes, per thread.
+        """
+        where = "WHERE thread_id = ?" if thread_id is not None else ""
+        params = (str(thread_id),) if thread_id is not None else ()
+
+        stats = {}
+        with self.cursor(transaction=False) as cur:
+            for row in cur.execute(f"""
+                SELECT thread_id, COUNT(*), COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0)
+                FROM checkpoints {where} GROUP BY thread_id
+            """, params).fetchall():
+                stats[row[0]] = {"checkpoints": row[1], "checkpoint_bytes": row[2],
+                                 "writes": 0, "write_bytes": 0, "last_used": None}
+
+            for row in cur.execute(f"""
+                SELECT thread_id, COUNT(*), COALESCE(SUM(LENGTH(value)), 0)
+                FROM writes {where} GROUP BY thread_id
+            """, params).fetchall():
+                entry = stats.setdefault(row[0], {"checkpoints": 0, "checkpoint_bytes": 0, "last_used": None})
+                entry["writes"] = row[1]
+                entry["write_bytes"] = row[2]
+
+            for row in cur.execute(f"SELECT thread_id, last_used FROM thread_activity {where}", params).fetchall():
+                if row[0] in stats:
+                    stats[row[0]]["last_used"] = row[1]
+
+        for entry in stats.values():
+            entry["total_bytes"] = entry["checkpoint_bytes"] + entry["write_bytes"]
+        return stats
+
+    # async API used by async_agent_graph; the lock in cursor() serializes access
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def build_checkpointer():
+    """
+    The graph checkpointer: SQLite-backed unless CHECKPOINT_PERSIST is off.
+    """
+    if not settings.CHECKPOINT_PERSIST:
+        return MemorySaver()
+
+    checkpointer = PersistentCheckpointer(
+        path=settings.CHECKPOINT_PATH,
+        max_history=settings.CHECKPOINT_MAX_HISTORY,
+        thread_ttl_seconds=settings.CHECKPOINT_THREAD_TTL_SECONDS,
+        compact_interval=settings.CHECKPOINT_COMPACT_INTERVAL
+    )
+    checkpointer.start_background_compaction()
+    return checkpointer
@@ -1,9 +1,8 @@
+import threading
+
 from src.config_nodes import AttributeConfig
 from src.utils_db import get_unique_values
 
-availabel_styles = get_unique_values("style")
-availabel_materials = get_unique_values("material")
-
 STYLE_LOGIC_MAP = {
     "Solitaire": {
         "vibe": "Timeless, elegant, minimalist, traditional, focus on the center stone.",
@@ -70,12 +69,7 @@ MATERIAL_LOGIC_MAP = {
     }
 }
 
-style_config = AttributeConfig(
-    name="style",
-    state_key="style",
-    dependency_keys=[],
-    valid_options=availabel_styles,
-    prompt_template=f"""
+STYLE_PROMPT_TEMPLATE = f"""
     ### KNOWLEDGE BASE (Style Associations):
     {STYLE_LOGIC_MAP}
 
@@ -101,14 +95,8 @@ style_config = AttributeConfig(
     **4. EXPLAIN YOUR LOGIC**
     - In the 'reasoning' field, explain the synthesis: "Recommended [Styles] because the user mentioned [Persona/Event], which aligns with [Style Qualities]."
     """
-)
-
-material_config = AttributeConfig(
-    name="material",
-    state_key="material",
-    dependency_keys=["style"],
-    valid_options=availabel_materials,
-    prompt_template=f"""
+
+MATERIAL_PROMPT_TEMPLATE = f"""
     ### KNOWLEDGE BASE (Material Associations):
     {MATERIAL_LOGIC_MAP}
 
@@ -141,4 +129,34 @@ material_config = AttributeConfig(
     
     You msut be very careful with very similar material. For example, "White gold" and "14K White gold". Don't be confused.
     """
-)
+
+ATTRIBUTE_SPECS = {
+    "style": {
+        "state_key": "style",
+        "dependency_keys": [],
+        "prompt_template": STYLE_PROMPT_TEMPLATE,
+    },
+    "material": {
+        "state_key": "material",
+        "dependency_keys": ["style"],
+        "prompt_template": MATERIAL_PROMPT_TEMPLATE,
+    },
+}
+
+_attribute_configs = {}
+_attribute_configs_lock = threading.Lock()
+
+
+def get_attribute_config(name):
+    """
+    The AttributeConfig of "style" / "material", built on first use: its valid
+    options come from the catalog (facet index).
+    """
+    with _attribute_configs_lock:
+        if name not in _attribute_configs:
+            _attribute_configs[name] = AttributeConfig(
+                name=name,
+                valid_options=get_unique_values(name),
+                **ATTRIBUTE_SPECS[name]
+            )
+        return _attribute_configs[name]
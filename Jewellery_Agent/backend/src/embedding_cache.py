@@ -0,0 +1,200 @@
+import hashlib
+import os
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from src import settings
+from src.model_registry import (
+    CLIP_MODEL_NAME,
+    COLPALI_MODEL_NAME,
+    colpali_query_model_name,
+    get_clip_model,
+    get_colpali_query_encoder,
+)
+
+
+def normalize_query(text, lowercase=False):
+    text = " ".join(str(text).split())
+    return text.lower() if lowercase else text
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU of query embeddings keyed by (model name, normalized query),
+    with an optional write-through .npy store on disk, itself kept under
+    `max_disk_bytes` by evicting the least recently used files.
+    """
+
+    def __init__(self, max_entries, persist_dir=None, max_disk_bytes=256 * 2**20):
+        self.max_entries = max_entries
+        self.persist_dir = persist_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk_bytes = 0
+        if self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+    @staticmethod
+    def make_key(model_name, query):
+        return hashlib.sha1(f"{model_name}\x00{query}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.persist_dir, f"{key}.npy")
+
+    def _scan_disk(self):
+        for name in os.listdir(self.persist_dir):
+            if name.endswith(".npy"):
+                path = os.path.join(self.persist_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _evict_disk_if_needed(self):
+        with self._lock:
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+
+            # least recently used first: disk hits bump the mtime
+            target = int(self.max_disk_bytes * 0.9)
+            for path, size, _ in sorted(self._scan_disk(), key=lambda entry: entry[2]):
+                if self._disk_bytes <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                self._disk_bytes -= size
+
+    def _write_disk(self, key, vector):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, vector)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                try:
+                    old_size = os.path.getsize(path)
+                except OSError:
+                    old_size = 0
+                os.replace(tmp_path, path)
+                self._disk_bytes += size - old_size
+        except OSError as e:
+            print(f"Embedding cache write error: {e}")
+            return
+        self._evict_disk_if_needed()
+
+    def _remember(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, model_name, query, compute_fn, dtype=np.float32):
+        """
+        Returns the cached embedding for `query`, or computes it with `compute_fn(query)`.
+        The returned array is read-only and shared between callers.
+        """
+        key = self.make_key(model_name, query)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.persist_dir and os.path.exists(self._disk_path(key)):
+            try:
+                vector = np.load(self._disk_path(key))
+                vector.setflags(write=False)
+                os.utime(self._disk_path(key))
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, vector)
+                return vector
+            except (OSError, ValueError) as e:
+                print(f"Embedding cache read error: {e}")
+
+        vector = np.ascontiguousarray(compute_fn(query), dtype=dtype)
+        vector.setflags(write=False)
+
+        with self._lock:
+            self.misses += 1
+            self._remember(key, vector)
+
+        if self.persist_dir:
+            self._write_disk(key, vector)
+
+        return vector
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk_bytes": self._disk_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+embedding_cache = EmbeddingCache(
+    max_entries=settings.EMBEDDING_CACHE_SIZE,
+    persist_dir=settings.EMBEDDING_CACHE_DIR if settings.EMBEDDING_CACHE_PERSIST else None,
+    max_disk_bytes=settings.EMBEDDING_CACHE_MAX_MB * 2**20
+)
+
+
+def _encode_clip_text(query):
+    return get_clip_model().encode(query)
+
+
+def _encode_colpali_query(query):
+    import torch
+
+    model, processor = get_colpali_query_encoder()
+    with torch.no_grad():
+        batch_query = processor.process_queries([query]).to(model.device)
+        query_embedding = model(**batch_query)
+    return query_embedding[0].cpu().float().numpy()
+
+
+def encode_clip_text(query):
+    """
+    CLIP text embedding (float32) for a visual product search query.
+    """
+    # The CLIP tokenizer lowercases anyway, so case variants share one entry
+    query = normalize_query(query, lowercase=True)
+    return embedding_cache.get_or_compute(CLIP_MODEL_NAME, query, _encode_clip_text)
+
+
+def encode_colpali_query(query):
+    """
+    ColPali query multivector (n_tokens x 128), kept as float16 in the cache.
+    """
+    query = normalize_query(query)
+    # int8 query embeddings differ slightly, they get their own cache entries
+    model_key = COLPALI_MODEL_NAME
+    if colpali_query_model_name() != "colpali":
+        model_key = f"{COLPALI_MODEL_NAME}:{colpali_query_model_name()}"
+    return embedding_cache.get_or_compute(
+        model_key, query, _encode_colpali_query, dtype=np.float16)
@@ -0,0 +1,170 @@
+import numpy as np
+
+FACET_FIELDS = ("style", "material", "gemstone")
+
+
+def _is_empty(value):
+    return value is None or value == "" or (isinstance(value, str) and value.lower() == "none")
+
+
+class FacetIndex:
+    """
+    In-memory facet index over the product_knowledge metadata.
+    Keeps one boolean bitmap per (field, value) and a sorted price column,
+    so filters become bitmap intersections instead of Chroma round trips.
+    """
+
+    def __init__(self, ids, metadatas, fields=FACET_FIELDS):
+        self.ids = np.asarray(ids, dtype=object)
+        self.size = len(self.ids)
+        self.bitmaps = {}
+
+        for field in fields:
+            column = [(meta or {}).get(field) for meta in metadatas]
+            codes = {}
+            inverse = np.empty(self.size, dtype=np.int32)
+            for i, value in enumerate(column):
+                inverse[i] = codes.setdefault(value, len(codes))
+
+            self.bitmaps[field] = {
+                value: inverse == code for value, code in codes.items() if value is not None
+            }
+
+        prices = np.array(
+            [(meta or {}).get("price") for meta in metadatas], dtype=np.float64)
+        self.price_order = np.argsort(prices, kind="stable")
+        self.sorted_prices = prices[self.price_order]
+
+    @classmethod
+    def from_collection(cls, collection, fields=FACET_FIELDS):
+        results = collection.get(include=["metadatas"])
+        return cls(results["ids"], results["metadatas"], fields)
+
+    def values(self, field):
+        return list(self.bitmaps[field].keys())
+
+    def active_filters(self, filters):
+        """
+        Drops the empty / "None" entries, mirroring what the agent treats as 'no preference'.
+        """
+        active = {}
+        for k, v in (filters or {}).items():
+            if _is_empty(v):
+                continue
+            if isinstance(v, list):
+                v = [item for item in v if not _is_empty(item)]
+                if not v:
+                    continue
+            if k == "price" and isinstance(v, dict):
+                v = {bound: v[bound] for bound in ("min", "max") if v.get(bound) is not None}
+                if not v:
+                    continue
+            active[k] = v
+        return active
+
+    def price_mask(self, min_price=None, max_price=None):
+        lo = 0
+        hi = self.size
+        if min_price is not None:
+            lo = np.searchsorted(self.sorted_prices, float(min_price), side="left")
+        if max_price is not None:
+            hi = np.searchsorted(self.sorted_prices, float(max_price), side="right")
+
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.price_order[lo:hi]] = True
+        return mask
+
+    def field_mask(self, field, value):
+        if field == "price":
+            return self.price_mask(value.get("min"), value.get("max"))
+
+        if field not in self.bitmaps:
+            raise KeyError(f"Field '{field}' is not indexed")
+
+        bitmaps = self.bitmaps[field]
+        values = value if isinstance(value, list) else [value]
+
+        mask = np.zeros(self.size, dtype=bool)
+        for v in values:
+            if v in bitmaps:
+                mask |= bitmaps[v]
+        return mask
+
+    def mask(self, filters):
+        mask = np.ones(self.size, dtype=bool)
+        for k, v in self.active_filters(filters).items():
+            mask &= self.field_mask(k, v)
+        return mask
+
+    def count(self, filters):
+        return int(np.count_nonzero(self.mask(filters)))
+
+    def exists(self, filters):
+        return bool(self.mask(filters).any())
+
+    def matching_ids(self, filters):
+        return self.ids[self.mask(filters)].tolist()
+
+    def diagnose_relaxations(self, filters):
+        """
+        Exact item counts for every leave-one-out and leave-two-out relaxation
+        of the active filters, computed in one pass over the filter bitmaps.
+        """
+        active = self.active_filters(filters)
+        names = list(active.keys())
+
+        diagnosis = {
+            "filters": active,
+            "total": self.size,
+            "exact": self.size,
+            "leave_one_out": [],
+            "leave_two_out": [],
+        }
+        if not names:
+            return diagnosis
+
+        # fails[i, n] is True when item n violates filter i
+        fails = np.stack([~self.field_mask(k, v) for k, v in active.items()])
+        n_fails = fails.sum(axis=0)
+
+        exact = int(np.count_nonzero(n_fails == 0))
+        only_fail = fails[:, n_fails == 1].sum(axis=1)
+        pair_fail = fails[:, n_fails == 2].astype(np.int32)
+        both_fail = pair_fail @ pair_fail.T
+
+        diagnosis["exact"] = exact
+        for i, name in enumerate(names):
+            diagnosis["leave_one_out"].append({
+                "relaxed": [name],
+                "count": exact + int(only_fail[i])
+            })
+            for j in range(i + 1, len(names)):
+                diagnosis["leave_two_out"].append({
+                    "relaxed": [name, names[j]],
+                    "count": exact + int(only_fail[i]) + int(only_fail[j]) + int(both_fail[i, j])
+                })
+
+        return diagnosis
+
+
+def describe_relaxations(diagnosis):
+    """
+    Renders a relaxation diagnosis as prompt-ready suggestion lines.
+    """
+    lines = []
+    filters = diagnosis["filters"]
+
+    for option in diagnosis["leave_one_out"]:
+        if option["count"] > 0:
+            name = option["relaxed"][0]
+            lines.append(
+                f"-Option: Keep everything but change '{name}' (currently {filters[name]}), we have {option['count']} items.")
+
+    if not lines:
+        for option in diagnosis["leave_two_out"]:
+            if option["count"] > 0:
+                first, second = option["relaxed"]
+                lines.append(
+                    f"-Option: Keep everything but change both '{first}' and '{second}', we have {option['count']} items.")
+
+    return "\n".join(lines)
@@ -1,38 +1,34 @@
 from langgraph.graph import StateGraph, START, END
 from src.state import AgentState
-from src.nodes.memory import summarize_conversation, santize_previous_ai
+from src.nodes.memory import summarize_conversation, santize_previous_ai, asummarize_conversation, asantize_previous_ai
 from src.nodes.intent import run_agent_logic
-from langgraph.checkpoint.memory import MemorySaver
-from src.nodes.guardrails import check_relevance, refusal_node, greeting_node
-from src.nodes.knowledge_router import route_knowledge_retrieval
-from src.nodes.retrieve import retrieve_documents
-from functools import partial
-from src.nodes.generic_inference import run_attribute_inference, run_price_inference
-from src.config_nodes import AttributeConfig
-from src.configs import style_config, material_config
-from src.nodes.response_generator import generate_no_preference_response, generate_conflict_response
-from src.nodes.final_response import generate_final_response
-
-infer_style_node = partial(run_attribute_inference, node_config=style_config)
-infer_material_node = partial(
-    run_attribute_inference, node_config=material_config)
-
-
-workflow = StateGraph(AgentState)
-
-workflow.add_node("santizer", santize_previous_ai)
-workflow.add_node("guardrail", check_relevance)
-workflow.add_node("greeting", greeting_node)
-workflow.add_node("refusal", refusal_node)
-workflow.add_node("knowledge_router", route_knowledge_retrieval)
-workflow.add_node("retrieve_documents", retrieve_documents)
-workflow.add_node("infer_style", infer_style_node)
-workflow.add_node("infer_material", infer_material_node)
-workflow.add_node("infer_price", run_price_inference)
-workflow.add_node("generate_conflict_response", generate_conflict_response)
-workflow.add_node("generate_no_preference", generate_no_preference_response)
-workflow.add_node("generate_final_response", generate_final_response)
-workflow.add_node("summarizer", summarize_conversation)
+from src.checkpointer import build_checkpointer
+from src.nodes.guardrails import check_relevance, acheck_relevance, refusal_node, greeting_node
+from src.nodes.knowledge_router import route_knowledge_retrieval, aroute_knowledge_retrieval
+from src.nodes.retrieve import retrieve_documents, aretrieve_documents
+from src.nodes.generic_inference import attribute_inference_nodes, run_price_inference, arun_price_inference
+from src.nodes.response_generator import generate_no_preference_response, generate_conflict_response, agenerate_no_preference_response, agenerate_conflict_response
+from src.nodes.final_response import generate_final_response, agenerate_final_response
+from src.utils import timed
+from src import settings
+
+# node name -> (sync implementation, async implementation)
+NODES = {
+    "santizer": (santize_previous_ai, asantize_previous_ai),
+    "guardrail": (timed("guardrail", check_relevance), timed("guardrail", acheck_relevance)),
+    "greeting": (greeting_node, greeting_node),
+    "refusal": (refusal_node, refusal_node),
+    "knowledge_router": (timed("knowledge_router", route_knowledge_retrieval),
+                         timed("knowledge_router", aroute_knowledge_retrieval)),
+    "retrieve_documents": (retrieve_documents, aretrieve_documents),
+    "infer_style": attribute_inference_nodes("style"),
+    "infer_material": attribute_inference_nodes("material"),
+    "infer_price": (run_price_inference, arun_price_inference),
+    "generate_conflict_response": (generate_conflict_response, agenerate_conflict_response),
+    "generate_no_preference": (generate_no_preference_response, agenerate_no_preference_response),
+    "generate_final_response": (generate_final_response, agenerate_final_response),
+    "summarizer": (summarize_conversation, asummarize_conversation),
+}
 
 
 def route_intent(state):
@@ -53,6 +49,17 @@ def knowledge_condition(state: AgentState):
         return "agent_logic"
 
 
+def route_after_gate(state: AgentState):
+    """
+    Parallel mode: the guardrail verdict wins, the router's decision is only
+    used for related turns.
+    """
+    intent = route_intent(state)
+    if intent != "agent":
+        return intent
+    return knowledge_condition(state)
+
+
 def route_generic(state: AgentState, key, next_node):
     val = state.get(key)
     if not val:
@@ -71,68 +78,112 @@ def route_inference(state: AgentState):
     return "generate_conflict_response"
 
 
-workflow.add_edge(START, "santizer")
-workflow.add_edge("santizer", "guardrail")
-
-workflow.add_conditional_edges(
-    "guardrail",
-    route_intent,
-    {
-        "greeting": "greeting",
-        "agent": "knowledge_router",
-        "refusal": "refusal"
-    }
-)
-
-workflow.add_conditional_edges(
-    "knowledge_router",
-    knowledge_condition,
-    {
-        "retrieve_documents": "retrieve_documents",
-        "agent_logic": "infer_style"
-    }
-)
-workflow.add_edge("retrieve_documents", "infer_style")
-workflow.add_conditional_edges(
-    "infer_style",
-    route_inference,
-    {
-        "next_node": "infer_material",
-        "generate_no_preference": "generate_no_preference",
-        "generate_conflict_response": "generate_conflict_response"
-    }
-)
-workflow.add_conditional_edges(
-    "infer_material",
-    route_inference,
-    {
-        "next_node": "infer_price",
-        "generate_no_preference": "generate_no_preference",
-        "generate_conflict_response": "generate_conflict_response"
-    }
-)
-workflow.add_conditional_edges(
-    "infer_price",
-    route_inference,
-    {
-        "next_node": "generate_final_response",
-        "generate_no_preference": "generate_no_preference",
-        "generate_conflict_response": "generate_conflict_response"
-    }
-
-)
-
-workflow.add_edge("greeting", "summarizer")
-workflow.add_edge("refusal", "summarizer")
-workflow.add_edge("generate_no_preference", "summarizer")
-workflow.add_edge("generate_conflict_response", "summarizer")
-workflow.add_edge("generate_final_response", "summarizer")
-workflow.add_edge("summarizer", END)
-
-memory = MemorySaver()
-
-agent_graph = workflow.compile(checkpointer=memory)
-
-graph_image = agent_graph.get_graph().draw_mermaid_png()
-with open("agent_graph.png", "wb") as f:
-    f.write(graph_image)
+def build_workflow(use_async=False, background_maintenance=None):
+    """
+    Builds the agent workflow. With use_async=True every I/O-bound node is the
+    coroutine version, for running the graph with ainvoke / astream.
+    With background maintenance, santizer and summarizer are left out: the
+    turn ends at the response node and src/maintenance.py does their work.
+    """
+    if background_maintenance is None:
+        background_maintenance = settings.BACKGROUND_MAINTENANCE
+    skipped = {"santizer", "summarizer"} if background_maintenance else set()
+    # first and last node of the turn
+    entry = START if background_maintenance else "santizer"
+    finish = END if background_maintenance else "summarizer"
+
+    workflow = StateGraph(AgentState)
+
+    for name, (sync_node, async_node) in NODES.items():
+        if name not in skipped:
+            workflow.add_node(name, async_node if use_async else sync_node)
+
+    if not background_maintenance:
+        workflow.add_edge(START, "santizer")
+
+    if settings.PARALLEL_ROUTING:
+        # both LLM calls start together; routing_gate waits for both of them
+        workflow.add_node("routing_gate", lambda state: {})
+        workflow.add_edge(entry, "guardrail")
+        workflow.add_edge(entry, "knowledge_router")
+        workflow.add_edge(["guardrail", "knowledge_router"], "routing_gate")
+
+        workflow.add_conditional_edges(
+            "routing_gate",
+            route_after_gate,
+            {
+                "greeting": "greeting",
+                "refusal": "refusal",
+                "retrieve_documents": "retrieve_documents",
+                "agent_logic": "infer_style"
+            }
+        )
+    else:
+        workflow.add_edge(entry, "guardrail")
+
+        workflow.add_conditional_edges(
+            "guardrail",
+            route_intent,
+            {
+                "greeting": "greeting",
+                "agent": "knowledge_router",
+                "refusal": "refusal"
+            }
+        )
+
+        workflow.add_conditional_edges(
+            "knowledge_router",
+            knowledge_condition,
+            {
+                "retrieve_documents": "retrieve_documents",
+                "agent_logic": "infer_style"
+            }
+        )
+
+    workflow.add_edge("retrieve_documents", "infer_style")
+    workflow.add_conditional_edges(
+        "infer_style",
+        route_inference,
+        {
+            "next_node": "infer_material",
+            "generate_no_preference": "generate_no_preference",
+            "generate_conflict_response": "generate_conflict_response"
+        }
+    )
+    workflow.add_conditional_edges(
+        "infer_material",
+        route_inference,
+        {
+            "next_node": "infer_price",
+            "generate_no_preference": "generate_no_preference",
+            "generate_conflict_response": "generate_conflict_response"
+        }
+    )
+    workflow.add_conditional_edges(
+        "infer_price",
+        route_inference,
+        {
+            "next_node": "generate_final_response",
+            "generate_no_preference": "generate_no_preference",
+            "generate_conflict_response": "generate_conflict_response"
+        }
+
+    )
+
+    workflow.add_edge("greeting", finish)
+    workflow.add_edge("refusal", finish)
+    workflow.add_edge("generate_no_preference", finish)
+    workflow.add_edge("generate_conflict_response", finish)
+    workflow.add_edge("generate_final_response", finish)
+    if not background_maintenance:
+        workflow.add_edge("summarizer", END)
+
+    return workflow
+
+
+memory = build_checkpointer()
+
+agent_graph = build_workflow().compile(checkpointer=memory)
+
+# same topology and checkpointer, driven with `await async_agent_graph.ainvoke(...)` / `astream(...)`
+async_agent_graph = build_workflow(use_async=True).compile(checkpointer=memory)
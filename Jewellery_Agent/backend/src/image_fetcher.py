@@ -0,0 +1,399 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import httpx
+import requests
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from src import settings
+
+
+class ImageFetcher:
+    """
+    Downloads product images in parallel over a pooled session and keeps the
+    bytes in a size-bounded, content-addressed (sha256 of the URL) disk cache.
+    Failed fetches are cached too, for `negative_ttl` seconds. The .json
+    metadata counts towards the size budget like the image bytes.
+    """
+
+    def __init__(self, cache_dir, max_cache_bytes, max_workers=8, timeout=5.0, negative_ttl=600.0):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_cache_bytes = max_cache_bytes
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="image-fetch")
+
+        # re-entrant: a future that is already done runs its callback inline
+        self._lock = threading.RLock()
+        self._inflight = {}
+        # (event loop, url) -> task, the async counterpart of _inflight
+        self._async_inflight = {}
+        self._async_clients = {}
+        self._background_tasks = set()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._cache_bytes = sum(size for _, size, _ in self._scan_cache())
+
+    @staticmethod
+    def image_id(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, image_id):
+        folder = os.path.join(self.cache_dir, image_id[:2])
+        return os.path.join(folder, f"{image_id}.bin"), os.path.join(folder, f"{image_id}.json")
+
+    def _scan_cache(self):
+        # image bytes (.bin, variants included) and their .json metadata
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith((".bin", ".json")):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _write_atomic(self, path, data):
+        """
+        Writes `data` to `path` and counts it in the cache size, net of the
+        file it replaces.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+        with self._lock:
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            self._cache_bytes += len(data) - old_size
+
+    def _remove(self, path, size):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return
+        self._cache_bytes -= size
+
+    def _expired_negative(self, meta_path):
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except OSError:
+            return False
+        except ValueError:
+            # unreadable metadata is as good as missing
+            return True
+        return not meta["ok"] and time.time() - meta["fetched_at"] >= self.negative_ttl
+
+    def _evict_if_needed(self):
+        with self._lock:
+            if self._cache_bytes <= self.max_cache_bytes:
+                return
+
+            # least recently used first: reads bump the mtime of the .bin file
+            entries = sorted(self._scan_cache(), key=lambda entry: entry[2])
+            images = [entry for entry in entries if entry[0].endswith(".bin")]
+            metas = [entry for entry in entries if entry[0].endswith(".json")]
+            target = int(self.max_cache_bytes * 0.9)
+
+            # failures past their TTL would be refetched anyway
+            for path, size, _ in metas:
+                if self._expired_negative(path):
+                    self._remove(path, size)
+
+            for path, size, _ in images:
+                if self._cache_bytes <= target:
+                    return
+                self._remove(path, size)
+
+            # the .json metadata maps an image id back to its URL, so /images
+            # references in old answers still resolve: it goes last
+            for path, size, _ in metas:
+                if self._cache_bytes <= target:
+                    return
+                if os.path.exists(path):
+                    self._remove(path, size)
+
+    def read_meta(self, image_id):
+        _, meta_path = self._paths(image_id)
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_cached(self, url):
+        """
+        Returns the cached result for `url`, or None if it has to be (re)fetched.
+        """
+        image_id = self.image_id(url)
+        meta = self.read_meta(image_id)
+        if meta is None:
+            return None
+
+        if not meta["ok"]:
+            if time.time() - meta["fetched_at"] < self.negative_ttl:
+                return {**meta, "image_id": image_id, "content": None}
+            return None
+
+        data_path, _ = self._paths(image_id)
+        try:
+            with open(data_path, "rb") as f:
+                content = f.read()
+            os.utime(data_path)
+        except OSError:
+            return None
+
+        return {**meta, "image_id": image_id, "content": content}
+
+    def _store(self, url, content, content_type, ok, error=None):
+        image_id = self.image_id(url)
+        data_path, meta_path = self._paths(image_id)
+        meta = {
+            "url": url,
+            "ok": ok,
+            "content_type": content_type,
+            "error": error,
+            "fetched_at": time.time(),
+        }
+
+        try:
+            if ok:
+                self._write_atomic(data_path, content)
+            self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            print(f"Image cache write error: {e}")
+
+        self._evict_if_needed()
+
+        return {**meta, "image_id": image_id, "content": content}
+
+    def read_variant(self, image_id, variant):
+        data_path = self._paths(image_id)[0][:-len(".bin")] + f".{variant}.bin"
+        try:
+            with open(data_path, "rb") as f:
+                content = f.read()
+            os.utime(data_path)
+            return content
+        except OSError:
+            return None
+
+    def store_variant(self, image_id, variant, content):
+        """
+        Stores a derived rendition (e.g. a resized copy) next to the original;
+        it counts towards, and is evicted with, the same size budget.
+        """
+        data_path = self._paths(image_id)[0][:-len(".bin")] + f".{variant}.bin"
+        try:
+            self._write_atomic(data_path, content)
+        except OSError as e:
+            print(f"Image cache write error: {e}")
+        self._evict_if_needed()
+
+    def fetch(self, url, timeout=None):
+        """
+        Returns {"image_id", "url", "ok", "content", "content_type", ...} for one URL.
+        """
+        cached = self.get_cached(url)
+        if cached is not None:
+            return cached
+
+        try:
+            resp = self.session.get(url, timeout=timeout or self.timeout)
+        except requests.RequestException as e:
+            print(f"Image Error: {e}")
+            return self._store(url, None, None, ok=False, error=str(e))
+
+        if resp.status_code != 200:
+            return self._store(url, None, None, ok=False, error=f"HTTP {resp.status_code}")
+
+        content_type = resp.headers.get("Content-Type", "image/jpeg")
+        return self._store(url, resp.content, content_type, ok=True)
+
+    def _submit(self, url, timeout):
+        with self._lock:
+            future = self._inflight.get(url)
+            if future is None:
+                future = self.executor.submit(self.fetch, url, timeout)
+                self._inflight[url] = future
+                future.add_done_callback(lambda _: self._forget(url))
+            return future
+
+    def _forget(self, url):
+        with self._lock:
+            self._inflight.pop(url, None)
+
+    def fetch_many(self, urls, deadline=None):
+        """
+        Fetches all URLs concurrently. Returns results in input order; entries
+        that failed or did not finish within `deadline` seconds are None.
+        Late downloads keep running in the background and land in the cache.
+        """
+        deadline = deadline or settings.IMAGE_FETCH_DEADLINE
+        results = [None] * len(urls)
+        pending = {}
+
+        for i, url in enumerate(urls):
+            cached = self.get_cached(url)
+            if cached is not None:
+                results[i] = cached if cached["ok"] else None
+            else:
+                pending[i] = self._submit(url, min(self.timeout, deadline))
+
+        if pending:
+            wait(pending.values(), timeout=deadline)
+            for i, future in pending.items():
+                if future.done() and future.exception() is None:
+                    result = future.result()
+                    results[i] = result if result["ok"] else None
+                else:
+                    print(f"Image Error: {urls[i]} missed the {deadline}s deadline")
+
+        return results
+
+    def _get_async_client(self):
+        # httpx clients are bound to the event loop they were first used on
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.max_workers,
+                                    max_keepalive_connections=self.max_workers)
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def afetch(self, url, timeout=None):
+        """
+        Async counterpart of fetch(); disk cache I/O runs in a worker thread.
+        """
+        cached = await asyncio.to_thread(self.get_cached, url)
+        if cached is not None:
+            return cached
+
+        try:
+            resp = await self._get_async_client().get(url, timeout=timeout or self.timeout)
+        except httpx.HTTPError as e:
+            print(f"Image Error: {e}")
+            return await asyncio.to_thread(self._store, url, None, None, False, str(e))
+
+        if resp.status_code != 200:
+            return await asyncio.to_thread(
+                self._store, url, None, None, False, f"HTTP {resp.status_code}")
+
+        content_type = resp.headers.get("Content-Type", "image/jpeg")
+        return await asyncio.to_thread(self._store, url, resp.content, content_type, True)
+
+    def _asubmit(self, url, timeout):
+        key = (asyncio.get_running_loop(), url)
+        with self._lock:
+            task = self._async_inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self.afetch(url, timeout))
+                self._async_inflight[key] = task
+                task.add_done_callback(lambda _: self._aforget(key))
+            return task
+
+    def _aforget(self, key):
+        with self._lock:
+            self._async_inflight.pop(key, None)
+
+    async def afetch_many(self, urls, deadline=None, on_result=None):
+        """
+        Async counterpart of fetch_many(), same ordering and deadline semantics.
+        `on_result(index, result)` is called for each successful download as
+        soon as it completes, e.g. to stream it to the client.
+        """
+        deadline = deadline or settings.IMAGE_FETCH_DEADLINE
+        timeout = min(self.timeout, deadline)
+        # a URL already being downloaded (e.g. by a concurrent request) is awaited, not refetched
+        tasks = [self._asubmit(url, timeout) for url in urls]
+        if not tasks:
+            return []
+
+        callbacks = []
+        if on_result is not None:
+            def make_callback(i):
+                def callback(task):
+                    if not task.cancelled() and task.exception() is None and task.result()["ok"]:
+                        on_result(i, task.result())
+                return callback
+
+            for i, task in enumerate(tasks):
+                callbacks.append(make_callback(i))
+                task.add_done_callback(callbacks[i])
+
+        await asyncio.wait(tasks, timeout=deadline)
+        # let pending callbacks of finished tasks run, then stop reporting late ones
+        await asyncio.sleep(0)
+        for task, callback in zip(tasks, callbacks):
+            task.remove_done_callback(callback)
+
+        results = []
+        for url, task in zip(urls, tasks):
+            if task.done() and task.exception() is None:
+                result = task.result()
+                results.append(result if result["ok"] else None)
+            else:
+                print(f"Image Error: {url} missed the {deadline}s deadline")
+                # let it finish in the background so it lands in the cache
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+                results.append(None)
+
+        return results
+
+    async def aclose(self):
+        """
+        Closes the async HTTP clients; call it from the app's shutdown hook.
+        Clients of other event loops are closed on their loop if it still runs.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = list(self._async_clients.items())
+            self._async_clients.clear()
+
+        for task in list(self._background_tasks):
+            if task.get_loop() is loop:
+                task.cancel()
+
+        for client_loop, client in clients:
+            if client_loop is loop:
+                await client.aclose()
+            elif client_loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), client_loop)
+
+
+def to_data_url(result):
+    encoded = base64.b64encode(result["content"]).decode("utf-8")
+    return f"data:{result['content_type']};base64,{encoded}"
+
+
+image_fetcher = ImageFetcher(
+    cache_dir=settings.IMAGE_CACHE_DIR,
+    max_cache_bytes=settings.IMAGE_CACHE_MAX_MB * 2**20,
+    max_workers=settings.IMAGE_FETCH_WORKERS,
+    timeout=settings.IMAGE_FETCH_TIMEOUT,
+    negative_ttl=settings.IMAGE_NEGATIVE_TTL
+)
@@ -0,0 +1,108 @@
+import base64
+import re
+
+from io import BytesIO
+from fastapi import APIRouter, HTTPException, Request, Response
+from PIL import Image
+from src import settings
+from src.image_fetcher import image_fetcher
+
+IMAGE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+LOCAL_IMAGE_PATTERN = re.compile(r"/images/([0-9a-f]{64})(?:\?w=(\d+))?$")
+
+image_router = APIRouter()
+
+
+def image_reference(result, width=None):
+    """
+    Stable URL of a fetched product image on the local /images endpoint.
+    """
+    width = width or settings.IMAGE_DEFAULT_WIDTH
+    return f"{settings.IMAGE_BASE_URL}/images/{result['image_id']}?w={width}"
+
+
+def _resize(content, width):
+    img = Image.open(BytesIO(content))
+    if img.width > width:
+        height = max(1, round(img.height * width / img.width))
+        img = img.resize((width, height), Image.LANCZOS)
+
+    buffered = BytesIO()
+    img.convert("RGB").save(buffered, format="JPEG", quality=85, optimize=True)
+    return buffered.getvalue()
+
+
+def load_image_variant(image_id, width=None):
+    """
+    Returns (content, content_type) of an image, resized to `width` when given.
+    Returns None if the image id is unknown, cannot be fetched or does not decode.
+    """
+    meta = image_fetcher.read_meta(image_id)
+    if meta is None or not meta["ok"]:
+        return None
+
+    if width:
+        variant = f"w{width}"
+        content = image_fetcher.read_variant(image_id, variant)
+        if content is not None:
+            return content, "image/jpeg"
+
+    original = image_fetcher.get_cached(meta["url"]) or image_fetcher.fetch(meta["url"])
+    if not original["ok"]:
+        return None
+
+    if not width:
+        return original["content"], original["content_type"]
+
+    try:
+        content = _resize(original["content"], width)
+    except (OSError, Image.DecompressionBombError) as e:
+        # e.g. an HTML error page served with status 200 and cached as the image
+        print(f"Image Decode Error ({image_id}): {e}")
+        return None
+    image_fetcher.store_variant(image_id, variant, content)
+    return content, "image/jpeg"
+
+
+def resolve_image_reference(url):
+    """
+    Turns a local /images reference back into a data URL (e.g. before sending it to a VLM).
+    Any other URL is returned unchanged.
+    """
+    match = LOCAL_IMAGE_PATTERN.search(url or "")
+    if not match or not url.startswith(settings.IMAGE_BASE_URL):
+        return url
+
+    width = int(match.group(2)) if match.group(2) else None
+    loaded = load_image_variant(match.group(1), width)
+    if loaded is None:
+        return url
+
+    content, content_type = loaded
+    return f"data:{content_type};base64,{base64.b64encode(content).decode('utf-8')}"
+
+
+@image_router.get("/images/{image_id}")
+def get_image(image_id: str, request: Request, w: int = 0):
+    if not IMAGE_ID_PATTERN.match(image_id):
+        raise HTTPException(status_code=404, detail="Unknown image")
+
+    if w and w not in settings.IMAGE_VARIANT_WIDTHS:
+        raise HTTPException(
+            status_code=400, detail=f"w must be one of {settings.IMAGE_VARIANT_WIDTHS}")
+
+    # the id is a hash of the source URL, so a given (id, width) never changes
+    etag = f'"{image_id}-{w}"'
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    loaded = load_image_variant(image_id, w or None)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Unknown image")
+
+    content, content_type = loaded
+    return Response(content=content, media_type=content_type, headers=headers)
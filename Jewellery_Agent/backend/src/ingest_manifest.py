@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+def content_hash(value):
+    """
+    Stable sha256 of a str / bytes / JSON-serializable value.
+    """
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    elif not isinstance(value, bytes):
+        value = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(value).hexdigest()
+
+
+class IngestManifest:
+    """
+    What an ingestion script has already written, per (kind, key): the content
+    hash it was built from plus some JSON data. Entries are committed one by
+    one, so an interrupted run resumes after the last finished item.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    data TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+            """)
+
+    def get(self, kind, key):
+        row = self._conn.execute(
+            "SELECT hash, data FROM entries WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        if row is None:
+            return None
+        return {"hash": row[0], "data": json.loads(row[1]) if row[1] else None}
+
+    def all(self, kind):
+        return {
+            key: {"hash": hash_, "data": json.loads(data) if data else None}
+            for key, hash_, data in self._conn.execute(
+                "SELECT key, hash, data FROM entries WHERE kind = ?", (kind,))
+        }
+
+    def put(self, kind, key, hash_, data=None):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (kind, key, hash, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, key, hash_, json.dumps(data) if data is not None else None, time.time()))
+
+    def delete(self, kind, key):
+        with self._conn:
+            self._conn.execute("DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key))
+
+    def clear(self, kind):
+        with self._conn:
+            self._conn.execute("DELETE FROM entries WHERE kind = ?", (kind,))
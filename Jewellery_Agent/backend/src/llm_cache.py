@@ -0,0 +1,151 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_google_genai import ChatGoogleGenerativeAI
+from src import settings
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    LangChain LLM cache backed by a local SQLite file.
+
+    The key hashes the serialized prompt (messages, including any image data
+    URLs) together with LangChain's llm_string, which covers the model name,
+    its parameters and bound tools, i.e. the structured-output schema.
+    Entries expire after `ttl_seconds`; the least recently used ones are
+    dropped once the table exceeds `max_entries`.
+    """
+
+    def __init__(self, path, ttl_seconds, max_entries):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._writes_since_trim = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache(last_used)")
+
+    @staticmethod
+    def make_key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            if now - row[1] > self.ttl_seconds:
+                with self._conn:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return loads(row[0])
+        except Exception as e:
+            print(f"LLM cache decode error: {e}")
+            return None
+
+    def update(self, prompt, llm_string, return_val):
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        value = dumps(list(return_val))
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now))
+
+            self._writes_since_trim += 1
+            if self._writes_since_trim >= 100:
+                self._trim()
+
+    def _trim(self):
+        self._writes_since_trim = 0
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def clear(self, **kwargs):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+llm_cache = SQLiteLLMCache(
+    path=settings.LLM_CACHE_PATH,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES
+) if settings.LLM_CACHE_ENABLED else None
+
+
+def get_chat_model(cache=True, **kwargs):
+    """
+    Builds the Gemini chat model used by the nodes. Pass cache=False for calls
+    whose prompts never repeat (e.g. summarization) to keep them out of the cache.
+    """
+    kwargs.setdefault("model", settings.LLM_MODEL_NAME)
+    kwargs.setdefault("temperature", 0)
+
+    if cache and llm_cache is not None:
+        kwargs["cache"] = llm_cache
+    else:
+        kwargs["cache"] = False
+
+    return ChatGoogleGenerativeAI(**kwargs)
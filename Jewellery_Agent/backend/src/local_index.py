@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+EMPTY_MANIFEST = {"version": 0, "embeddings": None, "rows": 0, "pages": []}
+
+
+def _normalize(vectors):
+    # cosine MaxSim, like the Qdrant collection
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class LocalPageIndex:
+    """
+    In-process alternative to the Qdrant guide collection, with the same
+    search() as QdrantPageIndex. All page token vectors live in one float16
+    file, memory-mapped for search, next to a JSON manifest of each page's
+    row range; MaxSim is computed as blocked matrix products.
+
+    One writer at a time (the ingestion script); readers pick up a new
+    manifest on their next search. Deleted pages leave unused rows until
+    compact() rewrites the file.
+    """
+
+    MANIFEST = "index.json"
+
+    def __init__(self, index_dir, dim=128, block_rows=65536):
+        self.index_dir = index_dir
+        self.dim = dim
+        # rows scored per matrix product, bounds the float32 copy made per block
+        self.block_rows = block_rows
+        os.makedirs(index_dir, exist_ok=True)
+
+        self._state = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def _load(self):
+        """
+        The manifest and search arrays as of the last write, reloaded when it changed.
+        """
+        try:
+            mtime = os.stat(self._path(self.MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        with self._lock:
+            if self._state is None or mtime != self._mtime:
+                manifest = dict(EMPTY_MANIFEST)
+                if mtime is not None:
+                    with open(self._path(self.MANIFEST)) as f:
+                        manifest = json.load(f)
+
+                embeddings = None
+                if manifest["rows"]:
+                    embeddings = np.memmap(self._path(manifest["embeddings"]), dtype=np.float16,
+                                           mode="r", shape=(manifest["rows"], self.dim))
+
+                pages = sorted(manifest["pages"], key=lambda page: page["start"])
+                self._state = {
+                    "manifest": manifest,
+                    "embeddings": embeddings,
+                    "pages": pages,
+                    "starts": np.array([page["start"] for page in pages], dtype=np.int64),
+                    "ends": np.array([page["start"] + page["length"] for page in pages], dtype=np.int64),
+                }
+                self._mtime = mtime
+            return self._state
+
+    def _write_manifest(self, manifest):
+        path = self._path(self.MANIFEST)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    def _blocks(self, starts, ends):
+        first = 0
+        while first < len(starts):
+            last = first + 1
+            while last < len(starts) and ends[last] - starts[first] <= self.block_rows:
+                last += 1
+            yield first, last
+            first = last
+
+    def search(self, multivector, k):
+        """
+        multivector: (tokens, dim) query embedding -> [{"source", "page_num", "pdf_hash", "score"}], best first.
+        """
+        state = self._load()
+        pages, starts, ends = state["pages"], state["starts"], state["ends"]
+        if not pages:
+            return []
+
+        query = _normalize(np.asarray(multivector, dtype=np.float32))
+        scores = np.empty(len(pages), dtype=np.float32)
+        for first, last in self._blocks(starts, ends):
+            base, stop = starts[first], ends[last - 1]
+            similarities = np.asarray(state["embeddings"][base:stop], dtype=np.float32) @ query.T
+
+            # [start, end) of every page interleaved with the gaps between them
+            bounds = np.empty(2 * (last - first), dtype=np.int64)
+            bounds[0::2] = starts[first:last] - base
+            bounds[1::2] = ends[first:last] - base
+            if bounds[-1] == len(similarities):
+                bounds = bounds[:-1]
+            page_max = np.maximum.reduceat(similarities, bounds, axis=0)[0::2]
+            scores[first:last] = page_max.sum(axis=1)
+
+        top = np.argsort(-scores)[:k]
+        return [{"source": pages[i]["source"],
+                 "page_num": pages[i]["page_num"],
+                 "pdf_hash": pages[i]["pdf_hash"],
+                 "score": float(scores[i])} for i in top]
+
+    def upsert_pages(self, source, pdf_hash, first_page, vectors):
+        """
+        Appends the multivectors of consecutive pages; a page already stored
+        for the same PDF version is replaced.
+        """
+        with self._write_lock:
+            manifest = dict(self._load()["manifest"])
+            if manifest["embeddings"] is None:
+                manifest["embeddings"] = f"embeddings.{manifest['version']}.f16"
+
+            pages = {(page["source"], page["pdf_hash"], page["page_num"]): page
+                     for page in manifest["pages"]}
+            rows = manifest["rows"]
+            with open(self._path(manifest["embeddings"]), "ab") as f:
+                # drop rows a crashed run appended without a manifest
+                f.truncate(rows * self.dim * 2)
+                for offset, multi_vectors in enumerate(vectors):
+                    multi_vectors = _normalize(np.asarray(multi_vectors, dtype=np.float32))
+                    f.write(multi_vectors.astype(np.float16).tobytes())
+
+                    page_num = first_page + offset
+                    pages[(source, pdf_hash, page_num)] = {
+                        "source": source,
+                        "page_num": page_num,
+                        "pdf_hash": pdf_hash,
+                        "start": rows,
+                        "length": len(multi_vectors),
+                    }
+                    rows += len(multi_vectors)
+
+            manifest["rows"] = rows
+            manifest["pages"] = list(pages.values())
+            self._write_manifest(manifest)
+
+    def is_ingested(self, source, pdf_hash, page_count):
+        pages = self._load()["pages"]
+        stored = sum(1 for page in pages if page["source"] == source and page["pdf_hash"] == pdf_hash)
+        return stored == page_count
+
+    def delete_document(self, source, keep_hash=None):
+        """
+        Drops the pages of `source`, except those of the version `keep_hash`.
+        """
+        with self._write_lock:
+            manifest = dict(self._load()["manifest"])
+            pages = [page for page in manifest["pages"]
+                     if page["source"] != source or (keep_hash and page["pdf_hash"] == keep_hash)]
+            if len(pages) != len(manifest["pages"]):
+                manifest["pages"] = pages
+                self._write_manifest(manifest)
+
+    def stored_sources(self):
+        return {page["source"] for page in self._load()["pages"]}
+
+    def compact(self):
+        """
+        Rewrites the embeddings without the rows of deleted / replaced pages,
+        into a new file so running readers keep their mapping.
+        """
+        with self._write_lock:
+            state = self._load()
+            manifest = state["manifest"]
+            live_rows = sum(page["length"] for page in state["pages"])
+            if live_rows == manifest["rows"]:
+                return
+
+            version = manifest["version"] + 1
+            embeddings_file = f"embeddings.{version}.f16"
+            pages = []
+            rows = 0
+            with open(self._path(embeddings_file), "wb") as f:
+                for page in state["pages"]:
+                    f.write(np.asarray(state["embeddings"][page["start"]: page["start"] + page["length"]]).tobytes())
+                    pages.append({**page, "start": rows})
+                    rows += page["length"]
+
+            old_file = manifest["embeddings"]
+            self._write_manifest({"version": version, "embeddings": embeddings_file,
+                                  "rows": rows, "pages": pages})
+            if old_file and old_file != embeddings_file:
+                os.remove(self._path(old_file))
+            print(f"Compacted {self.index_dir}: {manifest['rows']} -> {rows} rows")
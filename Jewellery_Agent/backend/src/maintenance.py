@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from src import settings
+from src.blob_store import externalize_images
+from src.nodes.memory import maintain_conversation
+
+
+class MaintenanceScheduler:
+    """
+    Runs the captioning / summarization of a finished turn in the background
+    (one task per thread) and writes the result back with update_state.
+    The next turn of the same thread waits for it if it is still running.
+
+    Pending tasks are tracked per process, so a thread's turns should reach
+    the same worker.
+    """
+
+    def __init__(self, max_workers=2):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="maintenance")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _run(self, graph, config):
+        start = time.perf_counter()
+        snapshot = graph.get_state(config)
+        if not snapshot.values.get("messages"):
+            return
+
+        updates = maintain_conversation(snapshot.values)
+        if updates.get("messages") or "summary" in updates:
+            graph.update_state(config, updates)
+
+        elapsed = round(time.perf_counter() - start, 3)
+        print(f"[timing] maintenance {config['configurable']['thread_id']}: {elapsed}s")
+
+    def _forget(self, thread_id, future):
+        with self._lock:
+            if self._pending.get(thread_id) is future:
+                del self._pending[thread_id]
+
+    def schedule(self, graph, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            future = self.executor.submit(self._run, graph, config)
+            self._pending[thread_id] = future
+        future.add_done_callback(lambda f: self._forget(thread_id, f))
+        return future
+
+    def _pending_future(self, thread_id):
+        with self._lock:
+            return self._pending.get(thread_id)
+
+    def wait(self, thread_id):
+        future = self._pending_future(thread_id)
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Maintenance Error: {e}")
+
+    async def await_thread(self, thread_id):
+        future = self._pending_future(thread_id)
+        if future is None:
+            return
+        try:
+            await asyncio.wrap_future(future)
+        except Exception as e:
+            print(f"Maintenance Error: {e}")
+
+
+maintenance = MaintenanceScheduler(max_workers=settings.MAINTENANCE_WORKERS)
+
+
+def externalize_inputs(inputs):
+    """
+    Turn inputs whose inline (base64) uploads are moved to the blob store, so
+    the first checkpoint of the turn already holds references. With
+    BACKGROUND_MAINTENANCE there is no santizer node to do it.
+    """
+    messages = inputs.get("messages") if isinstance(inputs, dict) else None
+    if not messages:
+        return inputs
+    return {**inputs, "messages": [externalize_images(message) for message in messages]}
+
+
+def invoke_turn(graph, inputs, config):
+    """
+    graph.invoke for one user turn, honouring BACKGROUND_MAINTENANCE.
+    """
+    inputs = externalize_inputs(inputs)
+    if not settings.BACKGROUND_MAINTENANCE:
+        return graph.invoke(inputs, config)
+
+    maintenance.wait(config["configurable"]["thread_id"])
+    result = graph.invoke(inputs, config)
+    maintenance.schedule(graph, config)
+    return result
+
+
+async def ainvoke_turn(graph, inputs, config):
+    inputs = await asyncio.to_thread(externalize_inputs, inputs)
+    if not settings.BACKGROUND_MAINTENANCE:
+        return await graph.ainvoke(inputs, config)
+
+    await maintenance.await_thread(config["configurable"]["thread_id"])
+    result = await graph.ainvoke(inputs, config)
+    maintenance.schedule(graph, config)
+    return result
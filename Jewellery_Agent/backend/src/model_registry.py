@@ -0,0 +1,142 @@
+import os
+import resource
+import threading
+import time
+
+from src import settings
+
+CLIP_MODEL_NAME = "clip-ViT-B-32"
+COLPALI_MODEL_NAME = "vidore/colpali-v1.2"
+
+_models = {}
+_stats = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def get_device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is the peak (KiB on Linux), the best we can do without /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _load_clip():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(CLIP_MODEL_NAME, device=get_device())
+
+
+def _load_colpali():
+    import torch
+    from colpali_engine.models import ColPali, ColPaliProcessor
+
+    device = get_device()
+    model = ColPali.from_pretrained(
+        COLPALI_MODEL_NAME,
+        dtype=torch.bfloat16 if device == "cuda" else torch.float32,
+        device_map=device
+    ).eval()
+    processor = ColPaliProcessor.from_pretrained(COLPALI_MODEL_NAME)
+    return model, processor
+
+
+def _load_colpali_int8():
+    import torch
+    from colpali_engine.models import ColPali, ColPaliProcessor
+
+    # Linear weights (almost all of the language model and vision tower) go to
+    # int8, activations are quantized on the fly; CPU only
+    model = ColPali.from_pretrained(
+        COLPALI_MODEL_NAME,
+        dtype=torch.float32,
+        device_map="cpu"
+    ).eval()
+    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    processor = ColPaliProcessor.from_pretrained(COLPALI_MODEL_NAME)
+    return model, processor
+
+
+MODEL_LOADERS = {
+    "clip": _load_clip,
+    "colpali": _load_colpali,
+    "colpali_int8": _load_colpali_int8,
+}
+
+
+def get_model(name):
+    """
+    Returns the process-wide instance of a model, loading it on first use.
+    """
+    if name in _models:
+        return _models[name]
+
+    if name not in MODEL_LOADERS:
+        raise KeyError(f"Unknown model '{name}'. Available: {list(MODEL_LOADERS)}")
+
+    with _registry_lock:
+        lock = _locks.setdefault(name, threading.Lock())
+
+    with lock:
+        if name not in _models:
+            rss_before = _current_rss_bytes()
+            start = time.perf_counter()
+
+            _models[name] = MODEL_LOADERS[name]()
+
+            _stats[name] = {
+                "load_seconds": round(time.perf_counter() - start, 3),
+                "rss_delta_mb": round((_current_rss_bytes() - rss_before) / 2**20, 1),
+            }
+            print(f"Loaded model '{name}' {_stats[name]}")
+
+    return _models[name]
+
+
+def get_clip_model():
+    return get_model("clip")
+
+
+def get_colpali():
+    """
+    Returns the shared (model, processor) pair for ColPali.
+    """
+    return get_model("colpali")
+
+
+def colpali_query_model_name():
+    if settings.COLPALI_QUERY_INT8 and get_device() == "cpu":
+        return "colpali_int8"
+    return "colpali"
+
+
+def get_colpali_query_encoder():
+    """
+    The (model, processor) pair that embeds queries: the int8 copy on CPU
+    when COLPALI_QUERY_INT8 is on, the shared ColPali otherwise.
+    """
+    return get_model(colpali_query_model_name())
+
+
+def warm_up(names=None):
+    """
+    Loads the given models (the ones serving queries by default) up front.
+    """
+    for name in names or ["clip", colpali_query_model_name()]:
+        get_model(name)
+    return model_stats()
+
+
+def model_stats():
+    return {
+        "loaded": list(_models),
+        "models": dict(_stats),
+        "process_rss_mb": round(_current_rss_bytes() / 2**20, 1),
+    }
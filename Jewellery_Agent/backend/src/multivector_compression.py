@@ -0,0 +1,73 @@
+import numpy as np
+
+from qdrant_client.http import models
+
+COMPRESSED_VECTOR = "colpali_pooled"
+MEAN_VECTOR = "colpali_mean"
+
+# bytes per dimension of a stored vector, by quantization
+BYTES_PER_DIM = {
+    "none": 4.0,
+    "scalar": 1.0,
+    "binary": 1.0 / 8,
+}
+
+
+def mean_pool(vectors):
+    """
+    One unit-length vector per page / query: the mean of its token vectors.
+    """
+    mean = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+    norm = np.linalg.norm(mean)
+    return mean / norm if norm else mean
+
+
+def pool_tokens(vectors, pool_factor):
+    """
+    Hierarchical token pooling: clusters a page's token vectors (Ward linkage
+    on cosine distance) into len / pool_factor groups and keeps each group's
+    mean, so similar patches (mostly blank background) collapse into one.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if pool_factor <= 1 or len(vectors) <= pool_factor:
+        return vectors
+
+    from scipy.cluster.hierarchy import fcluster, linkage
+    from scipy.spatial.distance import pdist
+
+    n_clusters = max(1, len(vectors) // pool_factor)
+    tree = linkage(pdist(vectors, metric="cosine"), method="ward")
+    labels = fcluster(tree, t=n_clusters, criterion="maxclust")
+
+    return np.stack([vectors[labels == label].mean(axis=0) for label in np.unique(labels)])
+
+
+def quantization_config(quantization):
+    """
+    Qdrant quantization of the compressed vector; the quantized copy is kept
+    in RAM, the full-precision one (used for rescoring) on disk.
+    """
+    if quantization == "scalar":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=True))
+    if quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    if quantization == "none":
+        return None
+    raise ValueError(f"Unknown quantization '{quantization}'. Available: {list(BYTES_PER_DIM)}")
+
+
+def compressed_vector_params(size, quantization):
+    return models.VectorParams(
+        size=size,
+        distance=models.Distance.COSINE,
+        multivector_config=models.MultiVectorConfig(
+            comparator=models.MultiVectorComparator.MAX_SIM
+        ),
+        quantization_config=quantization_config(quantization),
+        on_disk=quantization != "none"
+    )
+
+
+def vector_memory_bytes(n_vectors, dim, quantization="none"):
+    return n_vectors * dim * BYTES_PER_DIM[quantization]
@@ -1,33 +1,27 @@
+import asyncio
 import json
-import base64
-import requests
-import chromadb
+import re
 from typing import List, Dict, Any, Optional, Union
 from langchain_core.messages import AIMessage
 from langchain_core.prompts import PromptTemplate
+from langgraph.config import get_stream_writer
 from src.state import AgentState
 from src.utils_db import (
-    product_collection,
-    visual_collection,
-    get_unique_values,
-    get_smart_gallery,
+    get_visual_collection,
+    get_facet_index,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
-from src.utils import get_conversation_string
-from sentence_transformers import SentenceTransformer
+from src.llm_cache import get_chat_model
+from src.utils import get_conversation_string, ANSWER_TAG
+from src.embedding_cache import encode_clip_text
+from src.image_fetcher import image_fetcher
+from src.image_server import image_reference
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+llm = get_chat_model()
 
-client = chromadb.PersistentClient(path="./blue_nile_agentic_db")
-product_collection = client.get_collection(name="product_knowledge")
-visual_collection = client.get_collection(name="visual_index")
+IMAGE_LINK = re.compile(r"!\[([^\]]*)\]\(image_(\d+)\)")
 
 
-def generate_vector_search_query(state: AgentState):
-    """
-    Asks the LLM to rewrite the conversation context into a 
-    clean, visual search query for the vector database.
-    """
+def _vector_query_prompt(state: AgentState):
     summary = state.get("summary", "")
     context_str = get_conversation_string(state["messages"])
     last_msg = state["messages"][-1].content
@@ -56,84 +50,65 @@ def generate_vector_search_query(state: AgentState):
     Focus on visual keywords (e.g., "Vintage Halo Ring Rose Gold", "Solitaire Diamond Platinum").
     Do not include explanations, just the query string.
     """
+    return prompt
 
-    return llm.invoke(prompt).content.strip()
 
-
-def generate_final_response(state: AgentState):
+def generate_vector_search_query(state: AgentState):
     """
-    Final node: 
-    1. Diagnoses filters (Availability Check).
-    2. Generates visual search query.
-    3. Fetches items, visualizes them, and returns final payload.
+    Asks the LLM to rewrite the conversation context into a 
+    clean, visual search query for the vector database.
     """
+    return llm.invoke(_vector_query_prompt(state)).content.strip()
+
+
+async def agenerate_vector_search_query(state: AgentState):
+    return (await llm.ainvoke(_vector_query_prompt(state))).content.strip()
+
 
+def _matching_product_ids(state: AgentState):
+    """
+    1. Diagnoses filters (Availability Check) against the facet index.
+    """
     active_filters = {}
 
     if state.get("style"):
-        val = state["style"]
-        if isinstance(val, list):
-            active_filters["style"] = {"$in": val} if len(val) > 1 else val[0]
-        else:
-            active_filters["style"] = val
+        active_filters["style"] = state["style"]
 
     if state.get("material"):
-        val = state["material"]
-        if isinstance(val, list):
-            active_filters["material"] = {
-                "$in": val} if len(val) > 1 else val[0]
-        else:
-            active_filters["material"] = val
+        active_filters["material"] = state["material"]
 
     raw_price = state.get("price")
     if raw_price and isinstance(raw_price, str):
-        price_query = {}
+        price_range = {}
         try:
             if "+" in raw_price:
-                min_val = float(raw_price.replace("+", "").strip())
-                price_query["$gte"] = min_val
+                price_range["min"] = float(raw_price.replace("+", "").strip())
             elif "-" in raw_price:
                 parts = raw_price.split("-")
-                price_query["$gte"] = float(parts[0].strip())
-                price_query["$lte"] = float(parts[1].strip())
-            else:
-                pass
+                price_range["min"] = float(parts[0].strip())
+                price_range["max"] = float(parts[1].strip())
 
-            if price_query:
-                active_filters["price"] = price_query
+            if price_range:
+                active_filters["price"] = price_range
         except ValueError:
             print(f"Error parsing price string: {raw_price}")
 
-    all_rules = []
-    for k, v in active_filters.items():
-        if k == "price" and isinstance(v, dict) and len(v) > 1:
-            all_rules.append({"price": {"$gte": v.get("$gte")}})
-            all_rules.append({"price": {"$lte": v.get("$lte")}})
-        else:
-            all_rules.append({k: v})
-
-    strict_where = None
-    if len(all_rules) > 1:
-        strict_where = {"$and": all_rules}
-    elif len(all_rules) == 1:
-        strict_where = all_rules[0]
-
     try:
-        if strict_where:
-            results = product_collection.get(
-                where=strict_where, include=["metadatas"])
-        else:
-            results = product_collection.get(include=["metadatas"])
-        valid_ids = results["ids"]
+        valid_ids = get_facet_index().matching_ids(active_filters)
     except Exception as e:
         print(f"Filter Error: {e}")
         valid_ids = []
 
-    vector_search_query = generate_vector_search_query(state)
+    return valid_ids
+
+
+def _search_visual_items(vector_search_query, valid_ids):
+    """
+    3. Top 5 distinct products for the visual query among the valid ids.
+    """
     print(f"Generated Vector Query: {vector_search_query}")
 
-    embedding_model = SentenceTransformer("clip-ViT-B-32")
-    query_vector = embedding_model.encode(vector_search_query).tolist()
+    query_vector = encode_clip_text(vector_search_query).tolist()
 
     search_args = {
         "query_embeddings": [query_vector],
@@ -142,7 +117,7 @@ def generate_final_response(state: AgentState):
         "where": {"parent_id": {"$in": valid_ids}}
     }
 
-    visual_results = visual_collection.query(**search_args)
+    visual_results = get_visual_collection().query(**search_args)
 
     final_items = []
     seen_products = set()
@@ -159,33 +134,32 @@ def generate_final_response(state: AgentState):
             if len(final_items) >= 5:
                 break  # Top 5 results
 
+    return final_items
+
+
+def _build_gallery(final_items, fetched_images):
     image_gallery = []
     lean_context = []
 
-    for index, item in enumerate(final_items):
-        try:
-            image_url = item["image_url"]
-            resp = requests.get(image_url, stream=True, timeout=5)
-
-            if resp.status_code == 200:
-                ctype = resp.headers.get("Content-Type", "image/jpg")
-                b64_img = base64.b64encode(resp.content).decode("utf-8")
-
-                # A. Frontend List
-                image_gallery.append(f"data:{ctype};base64,{b64_img}")
-
-                # B. LLM Context
-                lean_context.append({
-                    "index": index,
-                    "name": item.get("name"),
-                    "price": item.get("price"),
-                    "description": f"{item.get('style', 'Ring')} in {item.get('material', 'Metal')}"
-                })
-        except Exception as e:
-            print(f"Image Error: {e}")
+    for item, image in zip(final_items, fetched_images):
+        if image is None:
             continue
 
-    # --- STEP 6: FINAL PROMPT ---
+        # LLM Context (index must match the position in the frontend list)
+        lean_context.append({
+            "index": len(image_gallery),
+            "name": item.get("name"),
+            "price": item.get("price"),
+            "description": f"{item.get('style', 'Ring')} in {item.get('material', 'Metal')}"
+        })
+
+        # Frontend List
+        image_gallery.append(image_reference(image))
+
+    return image_gallery, lean_context
+
+
+def _final_prompt(state: AgentState, vector_search_query, lean_context):
     context_str = json.dumps(lean_context, indent=2)
 
     system_prompt = f"""
@@ -209,9 +183,10 @@ def generate_final_response(state: AgentState):
     
     And if you want to save budget..."
     """
+    return system_prompt
 
-    llm_output = llm.invoke(system_prompt).content
 
+def _final_update(llm_output, image_gallery):
     final_payload = json.dumps({
         "response": llm_output,
         "images": image_gallery
@@ -220,3 +195,86 @@ def generate_final_response(state: AgentState):
     return {
         "messages": [AIMessage(content=final_payload)],
     }
+
+
+def generate_final_response(state: AgentState):
+    """
+    Final node: 
+    1. Diagnoses filters (Availability Check).
+    2. Generates visual search query.
+    3. Fetches items, visualizes them, and returns final payload.
+    """
+    valid_ids = _matching_product_ids(state)
+    vector_search_query = generate_vector_search_query(state)
+    final_items = _search_visual_items(vector_search_query, valid_ids)
+
+    fetched_images = image_fetcher.fetch_many(
+        [item["image_url"] for item in final_items])
+    image_gallery, lean_context = _build_gallery(final_items, fetched_images)
+
+    system_prompt = _final_prompt(state, vector_search_query, lean_context)
+    llm_output = llm.invoke(system_prompt).content
+
+    return _final_update(llm_output, image_gallery)
+
+
+def _item_context(final_items):
+    # streaming path: indexes are positions in final_items, images fill in later
+    return [{
+        "index": i,
+        "name": item.get("name"),
+        "price": item.get("price"),
+        "description": f"{item.get('style', 'Ring')} in {item.get('material', 'Metal')}"
+    } for i, item in enumerate(final_items)]
+
+
+def _drop_missing_images(llm_output, image_gallery):
+    """
+    Removes the gallery slots whose download failed, strips their
+    ![..](image_N) links from the answer and renumbers the remaining links.
+    """
+    positions = {}
+    for index, url in enumerate(image_gallery):
+        if url:
+            positions[index] = len(positions)
+
+    def relink(match):
+        index = int(match.group(2))
+        if index not in positions:
+            return ""
+        return f"![{match.group(1)}](image_{positions[index]})"
+
+    return IMAGE_LINK.sub(relink, llm_output), [url for url in image_gallery if url]
+
+
+async def agenerate_final_response(state: AgentState):
+    """
+    Async final node. The answer is generated while the product images
+    download; each image is sent to stream consumers as soon as it is ready.
+    Slots whose download fails are dropped from the final payload, as in the
+    sync path, and their image links removed from the answer.
+    """
+    # the facet index is built from Chroma on first use: keep it off the event loop
+    valid_ids = await asyncio.to_thread(_matching_product_ids, state)
+    vector_search_query = await agenerate_vector_search_query(state)
+
+    # CLIP encoding and the Chroma query are blocking
+    final_items = await asyncio.to_thread(
+        _search_visual_items, vector_search_query, valid_ids)
+
+    writer = get_stream_writer()
+    image_gallery = [""] * len(final_items)
+
+    def on_image(index, image):
+        image_gallery[index] = image_reference(image)
+        writer({"type": "image", "index": index, "url": image_gallery[index]})
+
+    fetching = asyncio.ensure_future(image_fetcher.afetch_many(
+        [item["image_url"] for item in final_items], on_result=on_image))
+
+    system_prompt = _final_prompt(state, vector_search_query, _item_context(final_items))
+    llm_output = (await llm.ainvoke(system_prompt, config={"tags": [ANSWER_TAG]})).content
+
+    await fetching
+    llm_output, image_gallery = _drop_missing_images(llm_output, image_gallery)
+    return _final_update(llm_output, image_gallery)
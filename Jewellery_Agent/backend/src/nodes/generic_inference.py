@@ -1,9 +1,12 @@
+import asyncio
+
 from langchain_core.messages import AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.llm_cache import get_chat_model
 from src.state import AgentState
-from src.utils import get_conversation_string
-from src.utils_db import check_product_availability
+from src.utils import get_conversation_string, knowledge_note, with_knowledge_pages
+from src.utils_db import check_product_availability, get_facet_index
 from src.config_nodes import AttributeConfig
+from src.configs import get_attribute_config
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
@@ -16,19 +19,16 @@ class GenericExtraction(BaseModel):
     )
 
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+llm = get_chat_model()
 
 
-def run_attribute_inference(state: AgentState, node_config: AttributeConfig):
-    """
-    Generic logic: Extraction -> Avalilabity Check
-    """
+def _attribute_prompt(state: AgentState, node_config: AttributeConfig):
     summary = state.get("summary", "")
     messages = state["messages"]
 
     last_user_msg = messages[-1].content
     context_str = get_conversation_string(messages)
-    context_pages = state.get("retrieved_images", "no external knowledge")
+    external_knowledge = knowledge_note(state)
 
     system_prompt = f"""
     You are a Jewellery Inventory Matcher.
@@ -40,7 +40,7 @@ def run_attribute_inference(state: AgentState, node_config: AttributeConfig):
     {node_config.prompt_template}
 
     EXTERNAL KNOWLEDGE:
-    {context_pages}
+    {external_knowledge}
 
     CONTEXT:
     {summary}
@@ -51,12 +51,45 @@ def run_attribute_inference(state: AgentState, node_config: AttributeConfig):
 
     Return the EXACT values from the list. If undecided, return ["None"].
     """
+    print(f"prompt: {system_prompt}")
+
+    return with_knowledge_pages(system_prompt, state)
+
 
+def run_attribute_inference(state: AgentState, node_config: AttributeConfig):
+    """
+    Generic logic: Extraction -> Avalilabity Check
+    """
+    extractor = llm.with_structured_output(GenericExtraction)
+    result = extractor.invoke(_attribute_prompt(state, node_config))
+    return _attribute_update(state, node_config, result)
+
+
+async def arun_attribute_inference(state: AgentState, node_config: AttributeConfig):
     extractor = llm.with_structured_output(GenericExtraction)
-    result = extractor.invoke(system_prompt)
+    result = await extractor.ainvoke(_attribute_prompt(state, node_config))
+    # availability check / relaxation diagnosis use the facet index (built from Chroma on first use)
+    return await asyncio.to_thread(_attribute_update, state, node_config, result)
+
+
+def attribute_inference_nodes(attribute):
+    """
+    (sync, async) graph nodes inferring `attribute`; its config, and the catalog
+    scan behind its valid options, is resolved on the first call.
+    """
+    def node(state: AgentState):
+        return run_attribute_inference(state, get_attribute_config(attribute))
+
+    async def anode(state: AgentState):
+        node_config = await asyncio.to_thread(get_attribute_config, attribute)
+        return await arun_attribute_inference(state, node_config)
+
+    return node, anode
+
+
+def _attribute_update(state: AgentState, node_config: AttributeConfig, result):
     detected_values = result.identified_values
 
-    print(f"prompt: {system_prompt}")
     print(f"intent reasoning: {result.reasoning}")
     print(f"detected values: {detected_values}")
 
@@ -93,6 +126,7 @@ def run_attribute_inference(state: AgentState, node_config: AttributeConfig):
             "inference_status": "invalid_inference",
             "inference_reasoning": result.reasoning,
             "node_name": node_config.name,
+            "relaxation_diagnosis": get_facet_index().diagnose_relaxations(check_filter),
             node_config.state_key: None
         }
 
@@ -119,15 +153,12 @@ class PriceExtraction(BaseModel):
     )
 
 
-def run_price_inference(state: AgentState):
-    """
-    Dedicated logic for extracting and validating Price/Budget.
-    """
+def _price_prompt(state: AgentState):
     messages = state["messages"]
     last_user_msg = messages[-1].content
     summary = state.get("summary", "")
     context_str = get_conversation_string(messages)
-    context_pages = state.get("retrieved_images", "no external knowledge")
+    external_knowledge = knowledge_note(state)
 
     # 1. SPECIALIZED PROMPT FOR NUMBERS
     system_prompt = f"""
@@ -144,7 +175,7 @@ def run_price_inference(state: AgentState):
     - If no budget is mentioned, set is_mentioned = False.
     
     EXTERNAL KNOWLEDGE:
-    {context_pages}
+    {external_knowledge}
     
     CONTEXT:
     {summary}
@@ -154,9 +185,25 @@ def run_price_inference(state: AgentState):
     {last_user_msg}
     """
 
+    return with_knowledge_pages(system_prompt, state)
+
+
+def run_price_inference(state: AgentState):
+    """
+    Dedicated logic for extracting and validating Price/Budget.
+    """
     extractor = llm.with_structured_output(PriceExtraction)
-    result = extractor.invoke(system_prompt)
+    result = extractor.invoke(_price_prompt(state))
+    return _price_update(state, result)
+
+
+async def arun_price_inference(state: AgentState):
+    extractor = llm.with_structured_output(PriceExtraction)
+    result = await extractor.ainvoke(_price_prompt(state))
+    return await asyncio.to_thread(_price_update, state, result)
+
 
+def _price_update(state: AgentState, result):
     print(f"price reasoning: {result.reasoning}")
 
     # 2. HANDLE NO PREFERENCE
@@ -189,6 +236,7 @@ def run_price_inference(state: AgentState):
             "inference_status": "invalid_inference",
             "inference_reasoning": result.reasoning,
             "node_name": "price",
+            "relaxation_diagnosis": get_facet_index().diagnose_relaxations(check_filter),
             "price": None
         }
 
@@ -1,4 +1,5 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.llm_cache import get_chat_model
+from src.blob_store import resolve_images
 from langchain_core.messages import SystemMessage, AIMessage
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
@@ -6,7 +7,7 @@ from typing import cast
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+llm = get_chat_model()
 
 
 class RelevanceScore(BaseModel):
@@ -18,7 +19,7 @@ class RelevanceScore(BaseModel):
 structured_llm = llm.with_structured_output(RelevanceScore)
 
 
-def check_relevance(state):
+def _relevance_messages(state):
     messages = state["messages"]
     summary = state.get("summary", "")
     last_user_msg = messages[-1]
@@ -33,8 +34,18 @@ def check_relevance(state):
     Current Summary Context: {summary}
     """
 
-    raw_response = structured_llm.invoke(
-        [SystemMessage(content=system_prompt), last_user_msg])
+    return [SystemMessage(content=system_prompt), resolve_images(last_user_msg)]
+
+
+def check_relevance(state):
+    raw_response = structured_llm.invoke(_relevance_messages(state))
+    response = cast(RelevanceScore, raw_response)
+
+    return {"is_relevant": response.category}
+
+
+async def acheck_relevance(state):
+    raw_response = await structured_llm.ainvoke(_relevance_messages(state))
     response = cast(RelevanceScore, raw_response)
 
     return {"is_relevant": response.category}
@@ -1,29 +1,15 @@
-import chromadb
 from typing import List, Dict
 from langchain_core.messages import AIMessage
 from pydantic import BaseModel, Field
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.llm_cache import get_chat_model
 from src.state import AgentState
-from src.utils import get_conversation_string
-
-db_client = chromadb.PersistentClient(path="./blue_nile_agentic_db")
-product_collection = db_client.get_collection(name="product_knowledge")
+from src.utils import get_conversation_string, knowledge_note, with_knowledge_pages
+from src.utils_db import get_product_collection, get_unique_values
 
 
 def get_unique_styles_from_db():
-    results = product_collection.get(include=["metadatas"])
-
-    unique_styles = set()
-    for meta in results["metadatas"]:
-        if meta and "style" in meta:
-            s = meta["style"]
-            if s and s != "Unknown":
-                unique_styles.add(s)
-
-    return list(unique_styles)
-
-
-VALID_STYLES = get_unique_styles_from_db()
+    # served by the shared facet index, built on first use
+    return get_unique_values("style")
 
 
 def check_product_availability(filters):
@@ -35,7 +21,7 @@ def check_product_availability(filters):
     else:
         where_clause = active_filters
 
-    results = product_collection.get(where=where_clause, limit=1)
+    results = get_product_collection().get(where=where_clause, limit=1)
     count = len(results["ids"])
 
     return {"exists": count > 0, "count": count}
@@ -48,13 +34,13 @@ class StyleExtraction(BaseModel):
     reasoning: str = Field(description="Reasoning.")
 
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+llm = get_chat_model()
 
 
 def infer_style_preference(state: AgentState):
     summary = state.get("summary", "")
     messages = state["messages"]
-    external_knowledge = state.get("retrieved_images", "no external knowledge")
+    external_knowledge = knowledge_note(state)
     conversation_history = get_conversation_string(messages)
     last_user_msg = messages[-1].content
 
@@ -63,7 +49,7 @@ def infer_style_preference(state: AgentState):
     Analyze the conversation and the provided expert knowledge for the user's STYLE preferences.
     
     ### VALID STYLES IN OUR INVENTORY:
-    {VALID_STYLES}
+    {get_unique_styles_from_db()}
     
     INSTRUCTIONS:
     - Only select styles that appear EXACTLY in the list above.
@@ -82,6 +68,6 @@ def infer_style_preference(state: AgentState):
     """
 
     extractor = llm.with_structured_output(StyleExtraction)
-    result = extractor.invoke(system_prompt)
-    detected_styles = results.idetified_styles
-    style_reason = results.reasoning
+    result = extractor.invoke(with_knowledge_pages(system_prompt, state))
+    detected_styles = result.identified_styles
+    style_reason = result.reasoning
@@ -1,5 +1,5 @@
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.llm_cache import get_chat_model
 from src.state import AgentState
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
@@ -7,7 +7,7 @@ from src.utils import get_conversation_string
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+llm = get_chat_model()
 
 
 class KnowledgeCheck(BaseModel):
@@ -21,11 +21,7 @@ class KnowledgeCheck(BaseModel):
         description="Brief explanation of why knowledge is or isn't need.")
 
 
-def route_knowledge_retrieval(state: AgentState):
-    """
-    Analyzes the user's query to decide if we need to fetch documents
-    about Diamond 4Cs, Material properties, or Selling guides.
-    """
+def _knowledge_messages(state: AgentState):
     summary = state.get("summary", "No summary yet")
     messages = state["messages"]
 
@@ -77,13 +73,30 @@ def route_knowledge_retrieval(state: AgentState):
     {user_query}
     """
 
-    structed_llm = llm.with_structured_output(KnowledgeCheck)
-    decision = structed_llm.invoke([
+    return [
         SystemMessage(content=system_prompt),
         HumanMessage(content=user_input)
-    ])
+    ]
+
 
+def _knowledge_decision(decision):
     print(
         f"Knowledge Check: {decision.need_external_knowledge} ({decision.reasoning})")
 
     return {"needs_retrieval": decision.need_external_knowledge}
+
+
+def route_knowledge_retrieval(state: AgentState):
+    """
+    Analyzes the user's query to decide if we need to fetch documents
+    about Diamond 4Cs, Material properties, or Selling guides.
+    """
+    structed_llm = llm.with_structured_output(KnowledgeCheck)
+    decision = structed_llm.invoke(_knowledge_messages(state))
+    return _knowledge_decision(decision)
+
+
+async def aroute_knowledge_retrieval(state: AgentState):
+    structed_llm = llm.with_structured_output(KnowledgeCheck)
+    decision = await structed_llm.ainvoke(_knowledge_messages(state))
+    return _knowledge_decision(decision)
@@ -1,19 +1,23 @@
 from langchain_core.messages import SystemMessage, HumanMessage, RemoveMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.llm_cache import get_chat_model
 from src.state import AgentState
+from src.blob_store import externalize_images
+from src.caption_cache import caption_images, acaption_images
 from dotenv import load_dotenv
 
+import asyncio
 import json
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+# summaries are unique per thread, caching them would only fill the store
+summary_llm = get_chat_model(cache=False)
 
 
-def _caption_and_clean_message(message, llm):
+def _extract_images(message):
     """
-    Helper: check if a message (Human or AI) has images.
-    If yes, uses LLM to caption them and returns a text-only version.
+    Helper: splits a message (Human or AI) into its text and image URLs.
+    Returns None if the message carries no images.
     """
     text_part = ""
     images = []
@@ -24,8 +28,7 @@ def _caption_and_clean_message(message, llm):
                 if block.get("type") == "text":
                     text_part += block.get("text", "")
                 elif block.get("type") == "image_url":
-                    url = block["image_url"]["url"]
-                    images.append(url)
+                    images.append(block["image_url"]["url"])
         else:
             return None
     elif isinstance(message, AIMessage):
@@ -35,74 +38,126 @@ def _caption_and_clean_message(message, llm):
 
             raw_imgs = data.get("images", [])
             for img in raw_imgs:
-                # images.append(f"data:image/jpeg;base64,{img}")
-                images.append(img)
+                # empty slots are images that failed to download while the answer streamed
+                if img:
+                    images.append(img)
         except (json.JSONDecodeError, TypeError):
             return None
 
     if not images:
         return None
 
-    vlm_content = [
-        {"type": "text", "text": "Describe the jewelry in these images in 1 short sentence or the image is irrevelant."}
-    ]
-    for img_url in images:
-        vlm_content.append({
-            "type": "image_url",
-            "image_url": {"url": img_url}
-        })
+    return text_part, images
 
-    caption_response = llm.invoke([HumanMessage(content=vlm_content)])
-    caption = caption_response.content
 
+def _captioned_text(message, text_part, caption):
     if isinstance(message, HumanMessage):
         return f"{text_part} [User showed images of: {caption}]"
     else:
         return f"{text_part} [Agent showed images of: {caption}]"
 
 
+def _caption_and_clean_message(message):
+    """
+    Helper: check if a message (Human or AI) has images.
+    If yes, captions them (from the caption cache where possible) and returns a text-only version.
+    """
+    extracted = _extract_images(message)
+    if extracted is None:
+        return None
+
+    text_part, images = extracted
+    caption = caption_images(images)
+    return _captioned_text(message, text_part, caption)
+
+
+async def _acaption_and_clean_message(message):
+    extracted = _extract_images(message)
+    if extracted is None:
+        return None
+
+    text_part, images = extracted
+    caption = await acaption_images(images)
+    return _captioned_text(message, text_part, caption)
+
+
+def _previous_ai_message(state):
+    messages = state["messages"]
+    if len(messages) >= 2 and isinstance(messages[-2], AIMessage):
+        return messages[-2]
+    return None
+
+
+def _externalized_upload(state):
+    """
+    The newest user message with any inline (base64) images moved to the blob
+    store, or None if it has none (e.g. the entry point already stored them).
+    """
+    message = state["messages"][-1]
+    externalized = externalize_images(message)
+    if externalized is message:
+        return None
+    return externalized
+
+
 def santize_previous_ai(state: AgentState):
     """
     Check if PREVIOUS AI message contains JSON with images.
     If yes, ask VLM to describe them, then overwrite with a text summary. 
     """
-    messages = state["messages"]
     updates = []
 
-    if len(messages) >= 2:
-        last_ai_msg = messages[-2]
-        if isinstance(last_ai_msg, AIMessage):
-            new_content = _caption_and_clean_message(last_ai_msg, llm)
+    upload = _externalized_upload(state)
+    if upload is not None:
+        updates.append(upload)
+
+    last_ai_msg = _previous_ai_message(state)
+    if last_ai_msg is not None:
+        new_content = _caption_and_clean_message(last_ai_msg)
 
-            if new_content:
-                updates.append(
-                    AIMessage(id=last_ai_msg.id, content=new_content))
+        if new_content:
+            updates.append(
+                AIMessage(id=last_ai_msg.id, content=new_content))
 
     return {"messages": updates}
 
 
-def summarize_conversation(state: AgentState):
+async def asantize_previous_ai(state: AgentState):
+    updates = []
+
+    upload = await asyncio.to_thread(_externalized_upload, state)
+    if upload is not None:
+        updates.append(upload)
+
+    last_ai_msg = _previous_ai_message(state)
+    if last_ai_msg is not None:
+        new_content = await _acaption_and_clean_message(last_ai_msg)
+
+        if new_content:
+            updates.append(
+                AIMessage(id=last_ai_msg.id, content=new_content))
+
+    return {"messages": updates}
+
+
+def _current_user_message(state):
+    messages = state["messages"]
+    if len(messages) >= 2 and isinstance(messages[-2], HumanMessage):
+        return messages[-2]
+    return None
+
+
+def _summary_prompt(state):
     """
-    Check is history is too long. If so, summarized the first chat turn
-    and deletes them from the active list.
+    Returns the summarization prompt and the messages it folds in,
+    or (None, []) while the history is still short.
     """
     stored_messages = state["messages"]
-    # print(f"stored_messages: {stored_messages}")
     current_summary = state.get("summary", "")
     print(f"summary: {current_summary}")
 
-    updates = []
-    if len(stored_messages) >= 2:
-        current_user_msg = stored_messages[-2]
-        if isinstance(current_user_msg, HumanMessage):
-            new_content = _caption_and_clean_message(current_user_msg, llm)
-
-            if new_content:
-                updates.append(HumanMessage(
-                    id=current_user_msg.id, content=new_content))
-
     if len(stored_messages) <= 6:
-        return {"messages": updates}
+        return None, []
 
     to_summarize = stored_messages[:2]
 
@@ -111,10 +166,10 @@ def summarize_conversation(state: AgentState):
     New Lines: {to_summarize}.\n
     Update the summary with the new lines. Keep it concise.
     """
+    return prompt, to_summarize
 
-    response = llm.invoke(prompt)
-    new_summary = response.content
 
+def _summary_update(updates, new_summary, to_summarize):
     for m in to_summarize:
         if m.id:
             updates.append(RemoveMessage(id=m.id))
@@ -123,3 +178,63 @@ def summarize_conversation(state: AgentState):
         "summary": new_summary,
         "messages": updates
     }
+
+
+def summarize_conversation(state: AgentState):
+    """
+    Check is history is too long. If so, summarized the first chat turn
+    and deletes them from the active list.
+    """
+    updates = []
+    current_user_msg = _current_user_message(state)
+    if current_user_msg is not None:
+        new_content = _caption_and_clean_message(current_user_msg)
+
+        if new_content:
+            updates.append(HumanMessage(
+                id=current_user_msg.id, content=new_content))
+
+    prompt, to_summarize = _summary_prompt(state)
+    if prompt is None:
+        return {"messages": updates}
+
+    response = summary_llm.invoke(prompt)
+    return _summary_update(updates, response.content, to_summarize)
+
+
+async def asummarize_conversation(state: AgentState):
+    updates = []
+    current_user_msg = _current_user_message(state)
+    if current_user_msg is not None:
+        new_content = await _acaption_and_clean_message(current_user_msg)
+
+        if new_content:
+            updates.append(HumanMessage(
+                id=current_user_msg.id, content=new_content))
+
+    prompt, to_summarize = _summary_prompt(state)
+    if prompt is None:
+        return {"messages": updates}
+
+    response = await summary_llm.ainvoke(prompt)
+    return _summary_update(updates, response.content, to_summarize)
+
+
+def maintain_conversation(state: AgentState):
+    """
+    Background-maintenance counterpart of santizer + summarizer, run after a
+    turn has been answered: captions the images of the turn's user message
+    and answer, and folds old turns into the summary.
+    """
+    updates = []
+    for message in state["messages"][-2:]:
+        new_content = _caption_and_clean_message(message)
+        if new_content:
+            updates.append(type(message)(id=message.id, content=new_content))
+
+    prompt, to_summarize = _summary_prompt(state)
+    if prompt is None:
+        return {"messages": updates}
+
+    response = summary_llm.invoke(prompt)
+    return _summary_update(updates, response.content, to_summarize)
@@ -1,16 +1,20 @@
+import asyncio
 import json
-import requests
-import base64
 
 from langchain_core.messages import AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langgraph.config import get_stream_writer
+from src.llm_cache import get_chat_model
 from src.state import AgentState
 from dotenv import load_dotenv
 from src.utils_db import get_unique_values, get_smart_gallery
+from src.facet_index import describe_relaxations
+from src.image_fetcher import image_fetcher
+from src.image_server import image_reference
+from src.utils import ANSWER_TAG
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+llm = get_chat_model()
 
 DEPENDENCY_CHAIN = {
     "style": [],
@@ -19,9 +23,8 @@ DEPENDENCY_CHAIN = {
 }
 
 
-def generate_no_preference_response(state: AgentState):
+def _gallery_items(state: AgentState):
     attr_name = state.get("node_name")
-    reasoning = state.get("inference_reasoning")
 
     print("HERE?")
     allowed_dependencies = DEPENDENCY_CHAIN.get(attr_name, [])
@@ -30,11 +33,6 @@ def generate_no_preference_response(state: AgentState):
         if state.get(dep_key):
             current_filters[dep_key] = state[dep_key]
 
-    output_payload = {
-        "response": "",
-        "images": []
-    }
-
     if attr_name == "price":
         current_options = []
     else:
@@ -48,34 +46,29 @@ def generate_no_preference_response(state: AgentState):
         current_filters=current_filters,
         limit=3
     )
+    return raw_gallery_items
+
+
+def _no_preference_prompt(state: AgentState, raw_gallery_items, fetched_images):
+    attr_name = state.get("node_name")
 
     final_image_payload = []
     llm_context_list = []
 
-    for index, item in enumerate(raw_gallery_items):
-        try:
-            image_url = item["image_url"]
-            image_response = requests.get(image_url, stream=True, timeout=25)
-
-            if image_response.status_code == 200:
-                content_type = image_response.headers.get(
-                    "Content-Type", "image/jpg")
-                encoded_image = base64.b64encode(
-                    image_response.content).decode("utf-8")
-                base64_string = f"data:{content_type};base64,{encoded_image}"
-
-                final_image_payload.append(base64_string)
-
-                llm_context_list.append({
-                    "index": index,
-                    "value": item["value"],
-                    "name": item["name"],
-                    "price": item.get("actual_price", "N/A")
-                })
-        except Exception as e:
-            print(f"Failed to download image for {item['name']}: {e}")
+    for item, image in zip(raw_gallery_items, fetched_images):
+        if image is None:
+            print(f"Failed to download image for {item['name']}")
             continue
 
+        llm_context_list.append({
+            "index": len(final_image_payload),
+            "value": item["value"],
+            "name": item["name"],
+            "price": item.get("actual_price", "N/A")
+        })
+
+        final_image_payload.append(image_reference(image))
+
     context_str = json.dumps(llm_context_list, indent=2)
 
     if attr_name == "price":
@@ -105,19 +98,57 @@ def generate_no_preference_response(state: AgentState):
     
     Which style speaks to you?"
     """
+    return prompt, final_image_payload
 
-    response_text = llm.invoke(prompt).content
 
+def _gallery_update(response_text, final_image_payload):
     return {
         "messages": [AIMessage(content=json.dumps({"response": response_text, "images": final_image_payload}))],
     }
 
 
-def generate_conflict_response(state: AgentState):
+def generate_no_preference_response(state: AgentState):
+    raw_gallery_items = _gallery_items(state)
+    fetched_images = image_fetcher.fetch_many(
+        [item["image_url"] for item in raw_gallery_items])
+
+    prompt, final_image_payload = _no_preference_prompt(
+        state, raw_gallery_items, fetched_images)
+    response_text = llm.invoke(prompt).content
+
+    return _gallery_update(response_text, final_image_payload)
+
+
+async def agenerate_no_preference_response(state: AgentState):
+    # the gallery issues several Chroma queries
+    raw_gallery_items = await asyncio.to_thread(_gallery_items, state)
+    fetched_images = await image_fetcher.afetch_many(
+        [item["image_url"] for item in raw_gallery_items])
+
+    prompt, final_image_payload = _no_preference_prompt(
+        state, raw_gallery_items, fetched_images)
+
+    writer = get_stream_writer()
+    for index, url in enumerate(final_image_payload):
+        writer({"type": "image", "index": index, "url": url})
+
+    response_text = (await llm.ainvoke(prompt, config={"tags": [ANSWER_TAG]})).content
+
+    return _gallery_update(response_text, final_image_payload)
+
+
+def _conflict_prompt(state: AgentState):
     status = state.get("inference_status")
     reasoning = state.get("inference_reasoning")
     attr_name = state.get("node_name")
-    value = state.get(attr_name)
+    diagnosis = state.get("relaxation_diagnosis")
+
+    if diagnosis:
+        value = diagnosis["filters"].get(attr_name)
+        suggestion = describe_relaxations(diagnosis) or "No single or double relaxation has items in stock."
+    else:
+        value = state.get(attr_name)
+        suggestion = "No diagnostic data available."
 
     # This is the "Explanation" message you wanted
     prompt = f"""
@@ -125,14 +156,32 @@ def generate_conflict_response(state: AgentState):
     You inferred the user wanted **{attr_name}: {value}** based on this reasoning: "{reasoning}".
     
     However, we DO NOT have any satisfiable items in stock.
+
+    DIAGNOSTIC DATA (exact stock counts if the user relaxes some preferences):
+    {suggestion}
     
     Task: Write a message that:
     1. Acknowledges their context (e.g. "Since your friend is a designer...")
     2. Explains you thought {attr_name}: {value} would be perfect.
     3. Apologizes that it is out of stock.
-    4. Asks if I am wrong or they would like to see alternatives.
+    4. Suggests the most promising alternatives from the diagnostic data, quoting the item counts.
+    5. Asks if I am wrong or they would like to see alternatives.
     """
-    response_text = llm.invoke(prompt).content
+    return prompt
+
+
+def generate_conflict_response(state: AgentState):
+    response_text = llm.invoke(_conflict_prompt(state)).content
+    final_msg = AIMessage(content=response_text)
+
+    return {
+        "messages": [final_msg]
+    }
+
+
+async def agenerate_conflict_response(state: AgentState):
+    response_text = (await llm.ainvoke(
+        _conflict_prompt(state), config={"tags": [ANSWER_TAG]})).content
     final_msg = AIMessage(content=response_text)
 
     return {
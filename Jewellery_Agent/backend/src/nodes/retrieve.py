@@ -1,24 +1,40 @@
 from src.state import AgentState
-from io import BytesIO
 from langchain_core.messages import SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.llm_cache import get_chat_model
 from src.vector_store import VisualRetriever
 from src.utils import get_conversation_string
+from src.blob_store import blob_store
+from src import settings
 
-import base64
+import asyncio
+import threading
 
-retriever = VisualRetriever()
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+_retriever = None
+_retriever_lock = threading.Lock()
+llm = get_chat_model()
 
 
-def retrieve_documents(state: AgentState):
+def get_retriever():
+    """
+    The VisualRetriever (ColPali query encoder + page index), created on the
+    first retrieval or by the warm-up.
+    """
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = VisualRetriever()
+    return _retriever
+
+
+def _query_prompt(state: AgentState):
     summary = state.get("summary", "")
     messages = state["messages"]
 
     last_user_msg = messages[-1].content
     conversation_history = get_conversation_string(messages)
 
-    query_prompt = f"""
+    return f"""
     CONTEXT: {summary}
     RECENT CONVERSATION: {conversation_history}
     USER QUERY: {last_user_msg}
@@ -26,20 +42,33 @@ def retrieve_documents(state: AgentState):
     Task: Write a concise search query to find relevant pages in a Jewelry Technical Manual.
     Example: "Diamond cut grading chart" or "Pricing strategy for 0.90 carat"
     """
-    search_query = llm.invoke(query_prompt).content.strip()
-
-    pil_images = retriever.retrieve_context_pages(search_query, k=1)
 
-    encoded_pages = []
 
-    if pil_images:
-        for img in pil_images:
-            buffered = BytesIO()
-            img.save(buffered, format="JPEG")
-            img_b64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-            encoded_pages.append(img_b64)
+def _retrieval_update(pages):
+    # the state (and every checkpoint) only holds blob references to the pages
+    page_refs = [blob_store.put(page, "image/jpeg") for page in pages]
 
     return {
-        "retrieved_images": encoded_pages,
+        "retrieved_images": page_refs,
         "needs_retrieval": False
     }
+
+
+def retrieve_documents(state: AgentState):
+    search_query = llm.invoke(_query_prompt(state)).content.strip()
+
+    pages = get_retriever().retrieve_context_pages(
+        search_query, k=1, max_side=settings.KNOWLEDGE_PAGE_MAX_SIDE)
+
+    return _retrieval_update(pages)
+
+
+async def aretrieve_documents(state: AgentState):
+    search_query = (await llm.ainvoke(_query_prompt(state))).content.strip()
+
+    # ColPali encoding and Qdrant lookup are blocking, keep them off the event loop
+    pages = await asyncio.to_thread(
+        lambda: get_retriever().retrieve_context_pages(
+            search_query, 1, settings.KNOWLEDGE_PAGE_MAX_SIDE))
+
+    return _retrieval_update(pages)
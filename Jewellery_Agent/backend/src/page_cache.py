@@ -0,0 +1,164 @@
+import os
+import shutil
+import threading
+
+from collections import OrderedDict
+from io import BytesIO
+from src import settings
+
+
+class PageCache:
+    """
+    Guide-document pages stored as ready-to-send JPEG bytes
+    (<cache_dir>/<source>/<pdf_hash>/page_0001.jpg, 1-based like the Qdrant
+    payload), with an in-memory LRU for hot pages. Keying by the PDF's content
+    hash means a re-ingested guide never serves the previous version's pages;
+    pages written before that live directly under <source>/ (pdf_hash None).
+    """
+
+    def __init__(self, cache_dir, dpi, max_memory_pages, documents_dir):
+        self.cache_dir = cache_dir
+        self.dpi = dpi
+        self.max_memory_pages = max_memory_pages
+        self.documents_dir = documents_dir
+
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def page_path(self, source, page_num, pdf_hash=None):
+        folder = os.path.join(self.cache_dir, source)
+        if pdf_hash:
+            folder = os.path.join(folder, pdf_hash)
+        return os.path.join(folder, f"page_{page_num:04d}.jpg")
+
+    def _remember(self, key, content):
+        with self._lock:
+            self._pages[key] = content
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_memory_pages:
+                self._pages.popitem(last=False)
+
+    def save_page(self, source, page_num, image, pdf_hash=None):
+        """
+        Encodes a rendered PIL page as JPEG and writes it to the cache.
+        """
+        buffered = BytesIO()
+        image.convert("RGB").save(buffered, format="JPEG", quality=85)
+        content = buffered.getvalue()
+
+        path = self.page_path(source, page_num, pdf_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        self._remember((source, pdf_hash, page_num), content)
+        return content
+
+    def load_page(self, source, page_num, pdf_hash=None):
+        """
+        Returns the JPEG bytes of a page, or None if it was never rasterized.
+        """
+        key = (source, pdf_hash, page_num)
+        with self._lock:
+            if key in self._pages:
+                self._pages.move_to_end(key)
+                return self._pages[key]
+
+        try:
+            with open(self.page_path(source, page_num, pdf_hash), "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+
+        self._remember(key, content)
+        return content
+
+    def get_page(self, source, page_num, max_side=None, pdf_hash=None):
+        """
+        Like load_page, but rasterizes (and caches) pages ingested before the cache existed.
+        With `max_side`, returns a downscaled copy (kept in the memory LRU).
+        """
+        if max_side:
+            return self._get_downscaled(source, page_num, max_side, pdf_hash)
+
+        content = self.load_page(source, page_num, pdf_hash)
+        if content is not None:
+            return content
+
+        from pdf2image import convert_from_path
+
+        pdf_path = os.path.join(self.documents_dir, f"{source}.pdf")
+        print(f"Page cache miss, rasterizing page {page_num} of {pdf_path}")
+        images = convert_from_path(
+            pdf_path, dpi=self.dpi, first_page=page_num, last_page=page_num)
+        if not images:
+            return None
+        return self.save_page(source, page_num, images[0], pdf_hash)
+
+    def _get_downscaled(self, source, page_num, max_side, pdf_hash=None):
+        key = (source, pdf_hash, page_num, max_side)
+        with self._lock:
+            if key in self._pages:
+                self._pages.move_to_end(key)
+                return self._pages[key]
+
+        content = self.get_page(source, page_num, pdf_hash=pdf_hash)
+        if content is None:
+            return None
+
+        from PIL import Image
+
+        img = Image.open(BytesIO(content))
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            buffered = BytesIO()
+            img.convert("RGB").save(buffered, format="JPEG", quality=85)
+            content = buffered.getvalue()
+
+        self._remember(key, content)
+        return content
+
+    def _forget(self, source):
+        with self._lock:
+            for key in [key for key in self._pages if key[0] == source]:
+                del self._pages[key]
+
+    def delete_document(self, source, keep_hash=None):
+        """
+        Drops the cached pages of `source`, except those of the version
+        `keep_hash`. Pages cached before versioning are moved under
+        `keep_hash` (the version the index holds) instead of being dropped.
+        """
+        folder = os.path.join(self.cache_dir, source)
+        if not os.path.isdir(folder):
+            self._forget(source)
+            return
+
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if os.path.isdir(path):
+                if name != keep_hash:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif keep_hash and name.startswith("page_"):
+                target = os.path.join(folder, keep_hash, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if os.path.exists(target):
+                    os.remove(path)
+                else:
+                    os.replace(path, target)
+            else:
+                os.remove(path)
+
+        if not keep_hash:
+            shutil.rmtree(folder, ignore_errors=True)
+        self._forget(source)
+
+
+page_cache = PageCache(
+    cache_dir=settings.PAGE_CACHE_DIR,
+    dpi=settings.PAGE_RENDER_DPI,
+    max_memory_pages=settings.PAGE_CACHE_MEMORY_PAGES,
+    documents_dir=settings.DOCUMENTS_DIR
+)
@@ -0,0 +1,70 @@
+import os
+import numpy as np
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from src import settings
+from src.multivector_compression import MEAN_VECTOR, mean_pool
+
+
+class QdrantPageIndex:
+    """
+    Guide-page search over the Qdrant collection. When the collection has the
+    mean-pooled page vector, the `prefetch_limit` closest pages by that single
+    vector are fetched first and only those are scored with MaxSim on `using`.
+    """
+
+    def __init__(self, client, collection_name, using=settings.GUIDE_SEARCH_VECTOR,
+                 prefetch_limit=settings.GUIDE_PREFETCH_LIMIT):
+        self.client = client
+        self.collection_name = collection_name
+        self.using = using
+        self.prefetch_limit = prefetch_limit
+        self._has_mean = None
+
+    def has_mean_vector(self):
+        # looked up on the first search: the collection may not exist yet at startup
+        if self._has_mean is None:
+            vectors = self.client.get_collection(self.collection_name).config.params.vectors
+            self._has_mean = MEAN_VECTOR in vectors
+            if not self._has_mean:
+                print(f"'{self.collection_name}' has no '{MEAN_VECTOR}' vector, "
+                      f"searching every page with MaxSim.")
+        return self._has_mean
+
+    def search(self, multivector, k):
+        """
+        multivector: (tokens, 128) query embedding -> [{"source", "page_num", "pdf_hash", "score"}], best first.
+        """
+        multivector = np.asarray(multivector, dtype=np.float32)
+        prefetch = None
+        if self.prefetch_limit and self.has_mean_vector():
+            prefetch = models.Prefetch(
+                query=mean_pool(multivector).tolist(),
+                using=MEAN_VECTOR,
+                limit=max(self.prefetch_limit, k)
+            )
+
+        points = self.client.query_points(
+            collection_name=self.collection_name,
+            prefetch=prefetch,
+            query=multivector.tolist(),
+            using=self.using,
+            limit=k,
+            with_payload=True
+        ).points
+
+        return [{"source": point.payload.get("source"),
+                 "page_num": point.payload.get("page_num"),
+                 "pdf_hash": point.payload.get("pdf_hash"),
+                 "score": point.score} for point in points]
+
+
+def build_page_index(collection_name, backend=settings.GUIDE_INDEX_BACKEND):
+    """
+    The guide-page index of `backend` ("qdrant" or "local", GUIDE_INDEX_BACKEND by default).
+    """
+    if backend == "local":
+        from src.local_index import LocalPageIndex
+        return LocalPageIndex(os.path.join(settings.LOCAL_INDEX_DIR, collection_name))
+    return QdrantPageIndex(QdrantClient(url="http://localhost:6333"), collection_name)
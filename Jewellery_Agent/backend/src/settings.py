@@ -0,0 +1,88 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# Query embedding cache (CLIP text vectors / ColPali query multivectors)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./cache/embeddings")
+EMBEDDING_CACHE_PERSIST = _env_bool("EMBEDDING_CACHE_PERSIST", False)
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "256"))
+
+# Product image fetching / on-disk image cache
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "./cache/images")
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "512"))
+IMAGE_FETCH_WORKERS = int(os.getenv("IMAGE_FETCH_WORKERS", "8"))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "5"))
+IMAGE_FETCH_DEADLINE = float(os.getenv("IMAGE_FETCH_DEADLINE", "8"))
+IMAGE_NEGATIVE_TTL = float(os.getenv("IMAGE_NEGATIVE_TTL", "600"))
+
+# Product images are served by reference from the backend's /images endpoint
+IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "http://127.0.0.1:8000").rstrip("/")
+IMAGE_DEFAULT_WIDTH = int(os.getenv("IMAGE_DEFAULT_WIDTH", "512"))
+IMAGE_VARIANT_WIDTHS = (128, 256, 512, 1024)
+# /images rejects any other width, so a bad value would break every product image
+if IMAGE_DEFAULT_WIDTH not in IMAGE_VARIANT_WIDTHS:
+    raise ValueError(
+        f"IMAGE_DEFAULT_WIDTH={IMAGE_DEFAULT_WIDTH} must be one of {IMAGE_VARIANT_WIDTHS}")
+
+# Guide-document pages, rasterized once at ingestion
+DOCUMENTS_DIR = os.getenv("DOCUMENTS_DIR", "./documents")
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "./page_cache")
+PAGE_RENDER_DPI = int(os.getenv("PAGE_RENDER_DPI", "200"))
+PAGE_CACHE_MEMORY_PAGES = int(os.getenv("PAGE_CACHE_MEMORY_PAGES", "64"))
+# Guide ingestion: pages rasterized per step (bounds memory), per ColPali batch, PDFs in parallel
+PDF_PAGES_PER_RENDER = int(os.getenv("PDF_PAGES_PER_RENDER", "8"))
+PDF_EMBED_BATCH_SIZE = int(os.getenv("PDF_EMBED_BATCH_SIZE", "4"))
+PDF_INGEST_WORKERS = int(os.getenv("PDF_INGEST_WORKERS", "1"))
+# Optional compressed copy of each page's multivector (token pooling by this factor,
+# 0 = off, plus none / scalar / binary quantization) and the named vector searched
+COLPALI_POOL_FACTOR = int(os.getenv("COLPALI_POOL_FACTOR", "0"))
+COLPALI_QUANTIZATION = os.getenv("COLPALI_QUANTIZATION", "scalar")
+GUIDE_SEARCH_VECTOR = os.getenv("GUIDE_SEARCH_VECTOR", "colpali")
+# CPU serving: embed ColPali queries with an int8 dynamically quantized copy of the model
+# (guide pages are still embedded in float32 at ingestion)
+COLPALI_QUERY_INT8 = _env_bool("COLPALI_QUERY_INT8", False)
+# Pages prefetched with the mean-pooled page vector before the exact MaxSim rerank (0 = MaxSim over every page)
+GUIDE_PREFETCH_LIMIT = int(os.getenv("GUIDE_PREFETCH_LIMIT", "200"))
+# "qdrant" (server at localhost:6333) or "local" (in-process float16 memmap index, no server)
+GUIDE_INDEX_BACKEND = os.getenv("GUIDE_INDEX_BACKEND", "qdrant").strip().lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "./cache/page_index")
+
+# Retrieved guide pages attached to the inference prompts as image parts
+KNOWLEDGE_MAX_PAGES = int(os.getenv("KNOWLEDGE_MAX_PAGES", "2"))
+KNOWLEDGE_PAGE_MAX_SIDE = int(os.getenv("KNOWLEDGE_PAGE_MAX_SIDE", "1024"))
+
+# Run the guardrail and the knowledge router concurrently (router result is
+# discarded for greetings / off-topic turns)
+PARALLEL_ROUTING = _env_bool("PARALLEL_ROUTING", True)
+
+# Persistent cache for (deterministic, temperature=0) LLM calls
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gemini-2.5-flash")
+LLM_CACHE_ENABLED = _env_bool("LLM_CACHE_ENABLED", True)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./cache/llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+# Conversation checkpoints, persisted in SQLite and shared by all workers
+CHECKPOINT_PERSIST = _env_bool("CHECKPOINT_PERSIST", True)
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./cache/checkpoints.sqlite3")
+CHECKPOINT_MAX_HISTORY = int(os.getenv("CHECKPOINT_MAX_HISTORY", "10"))
+CHECKPOINT_THREAD_TTL_SECONDS = float(os.getenv("CHECKPOINT_THREAD_TTL_SECONDS", str(7 * 24 * 3600)))
+CHECKPOINT_COMPACT_INTERVAL = float(os.getenv("CHECKPOINT_COMPACT_INTERVAL", "600"))
+
+# Content-addressed store for images referenced from conversation state
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "./cache/blobs")
+BLOB_STORE_MEMORY_ITEMS = int(os.getenv("BLOB_STORE_MEMORY_ITEMS", "64"))
+
+# Persistent image captions (conversation memory), precomputed for catalog images
+CAPTION_CACHE_PATH = os.getenv("CAPTION_CACHE_PATH", "./cache/captions.sqlite3")
+
+# Caption / summarize finished turns in the background instead of in the graph
+BACKGROUND_MAINTENANCE = _env_bool("BACKGROUND_MAINTENANCE", False)
+MAINTENANCE_WORKERS = int(os.getenv("MAINTENANCE_WORKERS", "2"))
@@ -1,19 +1,27 @@
-from typing import TypedDict, Annotated, List, Optional, Union
+from typing import TypedDict, Annotated, List, Optional, Union, Dict, Any
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
 from typing_extensions import NotRequired
 
 
+def merge_timings(left, right):
+    return {**(left or {}), **(right or {})}
+
+
 class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
     summary: NotRequired[str]
+    is_relevant: NotRequired[str]
     needs_retrieval: bool
-    retrieved_images: List[str]
+    retrieved_images: List[str]  # blob:// references of the retrieved guide pages
 
     inference_status: Optional[str]
     inference_reasoning: Optional[str]
     node_name: Optional[str]
+    relaxation_diagnosis: NotRequired[Optional[Dict[str, Any]]]
 
     style: Optional[Union[str, List[str]]]
     material: Optional[Union[str, List[str]]]
     price: Optional[Union[str, List[str]]]
+
+    node_timings: NotRequired[Annotated[Dict[str, float], merge_timings]]
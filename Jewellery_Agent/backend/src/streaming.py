@@ -0,0 +1,102 @@
+import json
+
+from typing import Optional
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel
+from src.graph import async_agent_graph
+from src.blob_store import blob_store
+from src.maintenance import maintenance
+from src import settings
+from src.utils import ANSWER_TAG
+
+stream_router = APIRouter()
+
+
+class ChatRequest(BaseModel):
+    query: str = ""
+    image: Optional[str] = None
+    thread_id: str
+
+
+def build_user_message(query, image=None):
+    if not image:
+        return HumanMessage(content=query)
+    # the upload is kept out of the checkpoints, only its blob reference is stored
+    return HumanMessage(content=[
+        {"type": "text", "text": query},
+        {"type": "image_url", "image_url": {"url": blob_store.put_data_url(image)}}
+    ])
+
+
+def parse_answer(message):
+    """
+    Final AI message -> {"response", "images"}; plain-text answers carry no images.
+    """
+    try:
+        data = json.loads(message.content)
+        if isinstance(data, dict):
+            return {"response": data.get("response", ""), "images": data.get("images", [])}
+    except (json.JSONDecodeError, TypeError):
+        pass
+    return {"response": message.content, "images": []}
+
+
+def _chunk_text(chunk):
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_chat(query, image, thread_id):
+    """
+    Runs one turn on the async graph and yields server-sent events:
+      node  - {"node"} whenever a graph node finishes
+      token - {"text"} chunks of the user-facing answer
+      image - {"index", "url"} as each product image becomes available
+      done  - {"response", "images"} the complete answer, same shape as /chat
+      error - {"detail"}
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    inputs = {"messages": [build_user_message(query, image)]}
+
+    try:
+        if settings.BACKGROUND_MAINTENANCE:
+            await maintenance.await_thread(thread_id)
+
+        async for mode, chunk in async_agent_graph.astream(
+                inputs, config, stream_mode=["updates", "messages", "custom"]):
+            if mode == "updates":
+                for node in chunk:
+                    yield sse_event("node", {"node": node})
+            elif mode == "messages":
+                message, metadata = chunk
+                if ANSWER_TAG in (metadata.get("tags") or []):
+                    text = _chunk_text(message)
+                    if text:
+                        yield sse_event("token", {"text": text})
+            elif mode == "custom" and chunk.get("type") == "image":
+                yield sse_event("image", {"index": chunk["index"], "url": chunk["url"]})
+
+        state = await async_agent_graph.aget_state(config)
+        if settings.BACKGROUND_MAINTENANCE:
+            maintenance.schedule(async_agent_graph, config)
+        yield sse_event("done", parse_answer(state.values["messages"][-1]))
+    except Exception as e:
+        print(f"Stream Error: {e}")
+        yield sse_event("error", {"detail": str(e)})
+
+
+@stream_router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    return StreamingResponse(
+        stream_chat(request.query, request.image, request.thread_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
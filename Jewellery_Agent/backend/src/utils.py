@@ -1,4 +1,13 @@
+import inspect
+import time
+
+from functools import wraps
 from langchain_core.messages import HumanMessage, AIMessage
+from src import settings
+from src.blob_store import blob_store, is_blob_ref
+
+# tag of the LLM calls whose tokens are the user-facing answer (streamed by src/streaming.py)
+ANSWER_TAG = "answer"
 
 
 def get_conversation_string(messages):
@@ -17,3 +26,66 @@ def get_conversation_string(messages):
         history_str += f"{role}: {msg.content}\n"
 
     return history_str
+
+
+def knowledge_note(state):
+    """
+    Text placeholder for the EXTERNAL KNOWLEDGE section of a prompt.
+    """
+    if state.get("retrieved_images"):
+        return "The attached images are pages retrieved from our expert guide documents."
+    return "no external knowledge"
+
+
+def with_knowledge_pages(prompt, state):
+    """
+    Wraps a text prompt into a multimodal message that carries the retrieved
+    guide pages as image parts (capped at KNOWLEDGE_MAX_PAGES), instead of
+    pasting their base64 text into the prompt.
+    """
+    pages = (state.get("retrieved_images") or [])[:settings.KNOWLEDGE_MAX_PAGES]
+
+    content = [{"type": "text", "text": prompt}]
+    for page in pages:
+        # blob references; plain base64 pages come from checkpoints written before the blob store
+        if is_blob_ref(page):
+            url = blob_store.to_data_url(page)
+            if is_blob_ref(url):
+                # pruned from the store: skip it rather than send the model a blob:// URL
+                continue
+        else:
+            url = f"data:image/jpeg;base64,{page}"
+        content.append({
+            "type": "image_url",
+            "image_url": {"url": url}
+        })
+
+    if len(content) == 1:
+        return [HumanMessage(content=prompt)]
+    return [HumanMessage(content=content)]
+
+
+def timed(node_name, node_fn):
+    """
+    Wraps a graph node (sync or async) so its wall-clock time is recorded
+    under state["node_timings"].
+    """
+    def record(result, start):
+        elapsed = round(time.perf_counter() - start, 3)
+        print(f"[timing] {node_name}: {elapsed}s")
+        return {**(result or {}), "node_timings": {node_name: elapsed}}
+
+    if inspect.iscoroutinefunction(node_fn):
+        @wraps(node_fn)
+        async def async_wrapper(state, *args, **kwargs):
+            start = time.perf_counter()
+            return record(await node_fn(state, *args, **kwargs), start)
+
+        return async_wrapper
+
+    @wraps(node_fn)
+    def wrapper(state, *args, **kwargs):
+        start = time.perf_counter()
+        return record(node_fn(state, *args, **kwargs), start)
+
+    return wrapper
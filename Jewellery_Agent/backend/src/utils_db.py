@@ -1,63 +1,81 @@
-import chromadb
 import random
+import threading
 
 from typing import Dict, Any, Union
+from src.facet_index import FacetIndex
 
-db_client = chromadb.PersistentClient(path="./blue_nile_agentic_db")
-product_collection = db_client.get_collection(name="product_knowledge")
-visual_collection = db_client.get_collection(name="visual_index")
+_db_client = None
+_collections = {}
+_db_lock = threading.Lock()
 
+_facet_index = None
+_facet_index_lock = threading.Lock()
 
-def check_product_availability(filters):
+
+def get_collection(name):
     """
-    Check if products exist in ChromaDB matching a set of metadata filters.
+    A collection of the catalog Chroma DB, opened on first use (chromadb
+    itself is only imported then).
     """
-    active_filters = []
+    global _db_client
+    with _db_lock:
+        if name not in _collections:
+            if _db_client is None:
+                import chromadb
+                _db_client = chromadb.PersistentClient(path="./blue_nile_agentic_db")
+            _collections[name] = _db_client.get_collection(name=name)
+        return _collections[name]
 
-    for k, v in filters.items():
-        if v is None or v == "" or (isinstance(v, str) and v.lower == "none"):
-            continue
 
-        if k == "price" and isinstance(v, dict):
-            if "min" in v and v["min"] is not None:
-                active_filters.append({"price": {"$gte": float(v["min"])}})
-            if "max" in v and v["max"] is not None:
-                active_filters.append({"price": {"$lte": float(v["max"])}})
+def get_product_collection():
+    return get_collection("product_knowledge")
 
-        elif isinstance(v, list):
-            active_filters.append({k: {"$in": v}})
-        else:
-            active_filters.append({k: v})
 
-    if len(active_filters) > 1:
-        where_clause = {"$and": active_filters}
-    else:
-        where_clause = active_filters[0]
+def get_visual_collection():
+    return get_collection("visual_index")
 
-    results = product_collection.get(
-        where=where_clause,
-        limit=1
-    )
 
-    count = len(results["ids"])
+def get_facet_index():
+    """
+    Lazily builds the in-memory facet index from product_knowledge (once per process).
+    """
+    global _facet_index
+    if _facet_index is None:
+        with _facet_index_lock:
+            if _facet_index is None:
+                _facet_index = FacetIndex.from_collection(get_product_collection())
+    return _facet_index
+
+
+def refresh_facet_index():
+    """
+    Rebuilds the facet index, e.g. after the catalog has been re-ingested.
+    """
+    global _facet_index
+    with _facet_index_lock:
+        _facet_index = FacetIndex.from_collection(get_product_collection())
+    return _facet_index
+
+
+def check_product_availability(filters):
+    """
+    Check if products exist in the catalog matching a set of metadata filters.
+    """
+    index = get_facet_index()
+    active_filters = index.active_filters(filters)
+
+    count = index.count(active_filters)
     exists = count > 0
 
     return {
         "exists": exists,
         "count": count,
-        "reason": f"Found matching items for {active_filters}" if exists else f"No items found for {active_filters}"
+        "reason": f"Found {count} matching items for {active_filters}" if exists else f"No items found for {active_filters}"
     }
 
 
 def get_unique_values(field_name):
-    results = product_collection.get(include=["metadatas"])
-    values = set()
-    for m in results["metadatas"]:
-        if m and field_name in m:
-            v = m[field_name]
-            if v and v != "Unknown":
-                values.add(v)
-    return list(values)
+    return [v for v in get_facet_index().values(field_name) if v and v != "Unknown"]
 
 
 def get_smart_gallery(attribute_name, available_options, current_filters, limit=6):
@@ -124,7 +142,7 @@ def get_smart_gallery(attribute_name, available_options, current_filters, limit=
 
 def _fetch_random_product(query, label_value, attribute_name):
     try:
-        product_results = product_collection.get(
+        product_results = get_product_collection().get(
             where=query,
             limit=5,
             include=["metadatas"]
@@ -141,6 +159,7 @@ def _fetch_random_product(query, label_value, attribute_name):
     p_name = product_results["metadatas"][random_idx]["name"]
     p_price = product_results["metadatas"][random_idx]["price"]
 
+    visual_collection = get_visual_collection()
     image_results = visual_collection.get(
         where={"$and": [{"parent_id": pid}, {"view_index": 0}]},
         limit=1,
@@ -1,64 +1,38 @@
-from qdrant_client import QdrantClient
-from colpali_engine.models import ColPali, ColPaliProcessor
-from pdf2image import convert_from_path
+from src.embedding_cache import encode_colpali_query
+from src.model_registry import get_colpali_query_encoder
+from src.page_cache import page_cache
+from src.page_index import build_page_index
 
-import torch
-import os
+import numpy as np
 
 
 class VisualRetriever:
     def __init__(self):
-        self.client = QdrantClient(url="http://localhost:6333")
         self.collection_name = "guide_documents"
+        self.index = build_page_index(self.collection_name)
 
-        if torch.cuda.is_available():
-            self.device = "cuda"
-        else:
-            self.device = "cpu"
+        # load the shared query encoder now rather than on the first question
+        get_colpali_query_encoder()
 
-        dtype = torch.bfloat16 if self.device == "cuda" else torch.float32
+    def retrieve_context_pages(self, query_text, k, max_side=None):
+        """
+        Returns the JPEG bytes of the k best matching guide pages,
+        downscaled to `max_side` pixels when given.
+        """
+        multivector_query = encode_colpali_query(query_text).astype(np.float32)
 
-        self.colpali_model = ColPali.from_pretrained(
-            "vidore/colpali-v1.2",
-            torch_dtype=dtype,
-            device_map=self.device
-        ).eval()
-
-        self.processor = ColPaliProcessor.from_pretrained(
-            "vidore/colpali-v1.2")
-
-    def retrieve_context_pages(self, query_text, k):
-        with torch.no_grad():
-            batch_query = self.processor.process_queries(
-                [query_text]).to(self.colpali_model.device)
-            query_embedding = self.colpali_model(**batch_query)
-
-        multivector_query = query_embedding[0].cpu().float().numpy().tolist()
-
-        search_result = self.client.query_points(
-            collection_name=self.collection_name,
-            query=multivector_query,
-            using="colpali",
-            limit=k
-        ).points
+        search_result = self.index.search(multivector_query, k)
 
         context_images = []
 
-        for point in search_result:
-            pdf_source = point.payload.get("source")
-            page_num = point.payload.get("page_num")
-
-            pdf_path = os.path.join("documents", f"{pdf_source}.pdf")
-
-            images = convert_from_path(
-                pdf_path,
-                first_page=page_num + 1,
-                last_page=page_num + 1
-            )
+        for hit in search_result:
+            pdf_source = hit["source"]
+            page_num = hit["page_num"]
 
-            if images:
-                context_images.append(images[0])
+            page = page_cache.get_page(pdf_source, page_num, max_side, hit.get("pdf_hash"))
+            if page:
+                context_images.append(page)
 
-            print(f"retrieved page {page_num + 1} from {pdf_source}")
+            print(f"retrieved page {page_num} from {pdf_source}")
 
         return context_images
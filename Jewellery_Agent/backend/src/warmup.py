@@ -0,0 +1,112 @@
+import threading
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+warmup_router = APIRouter()
+
+
+def _load_graph():
+    import src.graph  # noqa: F401 (compiles both graphs, opens the checkpointer)
+
+
+def _load_catalog():
+    from src.utils_db import get_facet_index, get_visual_collection
+    get_visual_collection()
+    get_facet_index()
+
+
+def _load_attribute_configs():
+    from src.configs import ATTRIBUTE_SPECS, get_attribute_config
+    for name in ATTRIBUTE_SPECS:
+        get_attribute_config(name)
+
+
+def _load_models():
+    from src.model_registry import warm_up
+    warm_up()
+
+
+def _load_retriever():
+    from src.nodes.retrieve import get_retriever
+    get_retriever()
+
+
+WARM_UP_STEPS = [
+    ("graph", _load_graph),
+    ("catalog", _load_catalog),
+    ("attribute_configs", _load_attribute_configs),
+    ("models", _load_models),
+    ("retriever", _load_retriever),
+]
+
+
+class WarmUp:
+    """
+    Everything the first request would otherwise pay for (catalog scans, CLIP /
+    ColPali, the retriever), run once in a background thread after startup.
+    The process answers /healthz immediately and /readyz only once this is done.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.status = "pending"
+        self.timings = {}
+        self.error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        self.status = "warming"
+        start = time.perf_counter()
+        try:
+            for name, step in self.steps:
+                step_start = time.perf_counter()
+                step()
+                self.timings[name] = round(time.perf_counter() - step_start, 3)
+        except Exception as e:
+            self.status = "failed"
+            self.error = f"{name}: {e}"
+            print(f"Warm-up Error: {self.error}")
+            return
+
+        self.timings["total"] = round(time.perf_counter() - start, 3)
+        self.status = "ready"
+        print(f"[timing] warm-up: {self.timings}")
+
+    def start(self):
+        """
+        Starts the warm-up in a daemon thread (once per process).
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+                self._thread.start()
+        return self._thread
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def report(self):
+        report = {"status": self.status, "timings": dict(self.timings)}
+        if self.error:
+            report["error"] = self.error
+        return report
+
+
+warmup = WarmUp(WARM_UP_STEPS)
+
+
+@warmup_router.get("/healthz")
+def healthz():
+    # a failed warm-up never becomes ready: let the orchestrator restart the worker
+    if warmup.status == "failed":
+        return JSONResponse(warmup.report(), status_code=503)
+    return {"status": "alive"}
+
+
+@warmup_router.get("/readyz")
+def readyz():
+    return JSONResponse(warmup.report(), status_code=200 if warmup.ready else 503)
@@ -1,18 +1,12 @@
 import torch
 from PIL import Image
-from colpali_engine.models import ColPali, ColPaliProcessor
+from src.model_registry import COLPALI_MODEL_NAME, get_colpali, model_stats
 
-model_name = "vidore/colpali-v1.2"
-device = "cuda" if torch.cuda.is_available() else "cpu"
+print(f"Loading {COLPALI_MODEL_NAME} ...")
 
-print(f"Loading {model_name} ...")
-
-model = ColPali.from_pretrained(
-    model_name,
-    dtype=torch.bfloat16,
-    device_map=device
-).eval()
-processor = ColPaliProcessor.from_pretrained(model_name)
+model, processor = get_colpali()
+device = model.device
+print(model_stats())
 
 dummy_image = Image.new("RGB", (224, 224), color="white")
 query = "A plain white image"
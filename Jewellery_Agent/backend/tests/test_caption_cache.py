@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("langchain_google_genai")
+
+from src import caption_cache as captions  # noqa: E402
+
+
+class FakeCaptionLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return captions.ImageCaptions(captions=[f"caption {self.calls}"])
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = captions.CaptionCache(str(tmp_path / "captions.sqlite3"))
+    llm = FakeCaptionLLM()
+    monkeypatch.setattr(captions, "caption_cache", cache)
+    monkeypatch.setattr(captions, "caption_llm", llm)
+    return cache, llm
+
+
+def test_catalog_caption_is_refreshed_when_the_view_url_changes(cache):
+    cache, llm = cache
+    key = cache.catalog_key("p1", 0)
+
+    captions.precompute_catalog_caption("p1", 0, "https://cdn.example/old.jpg", b"old")
+    captions.precompute_catalog_caption("p1", 0, "https://cdn.example/old.jpg", b"old")
+    assert llm.calls == 1
+    assert cache.get(key) == "caption 1"
+
+    captions.precompute_catalog_caption("p1", 0, "https://cdn.example/new.jpg", b"new")
+    assert llm.calls == 2
+    assert cache.get(key) == "caption 2"
+    assert cache.key_for("https://cdn.example/new.jpg") == key
+    # the old URL no longer resolves to the refreshed caption
+    assert cache.key_for("https://cdn.example/old.jpg") != key
@@ -20,6 +20,7 @@ export default function Home() {
   const [input, setInput] = useState("");
   const [messages, setMessages] = useState<Message[]>([]);
   const [isLoading, setIsLoading] = useState(false);
+  const [loadingStage, setLoadingStage] = useState("");
   const [selectedImage, setSelectedImage] = useState<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
@@ -69,19 +70,73 @@ export default function Home() {
     setMessages((prev) => [...prev, { role: "user", content: userText, images: userImage ? [userImage] : [], time: getCurrentTime() }]);
     setIsLoading(true);
 
+    // placeholder AI bubble, filled in as the stream arrives
+    const updateAiMessage = (update: (msg: Message) => Message) =>
+      setMessages((prev) => {
+        const last = prev[prev.length - 1];
+        if (!last || last.role !== "ai") return prev;
+        return [...prev.slice(0, -1), update(last)];
+      });
+    let started = false;
+    const startAiMessage = () => {
+      if (started) return;
+      started = true;
+      setIsLoading(false);
+      setMessages((prev) => [...prev, { role: "ai", content: "", images: [], time: getCurrentTime() }]);
+    };
+
     try {
-      const response = await fetch("http://127.0.0.1:8000/chat", {
+      const response = await fetch("http://127.0.0.1:8000/chat/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ query: userText, image: userImage, thread_id: currentThreadId }),
       });
-      if (!response.ok) throw new Error("Network error");
-      const data = await response.json();
-      setMessages((prev) => [...prev, { role: "ai", content: data.response, images: data.images || [], time: getCurrentTime() }]);
+      if (!response.ok || !response.body) throw new Error("Network error");
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // server-sent events are separated by a blank line
+        const frames = buffer.split("\n\n");
+        buffer = frames.pop() || "";
+
+        for (const frame of frames) {
+          const event = frame.match(/^event: (.*)$/m)?.[1];
+          const data = frame.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
+          const payload = JSON.parse(data);
+
+          if (event === "node") {
+            setLoadingStage(payload.node);
+          } else if (event === "token") {
+            startAiMessage();
+            updateAiMessage((msg) => ({ ...msg, content: msg.content + payload.text }));
+          } else if (event === "image") {
+            startAiMessage();
+            updateAiMessage((msg) => {
+              const images = [...(msg.images || [])];
+              images[payload.index] = payload.url;
+              return { ...msg, images };
+            });
+          } else if (event === "done") {
+            startAiMessage();
+            updateAiMessage((msg) => ({ ...msg, content: payload.response, images: payload.images || [] }));
+          } else if (event === "error") {
+            throw new Error(payload.detail);
+          }
+        }
+      }
     } catch (error) {
       setMessages((prev) => [...prev, { role: "ai", content: "! System Error.", time: getCurrentTime() }]);
     } finally {
       setIsLoading(false);
+      setLoadingStage("");
     }
   };
 
@@ -144,7 +199,7 @@ export default function Home() {
           <ChatBubble key={idx} message={msg} />
         ))}
 
-        {isLoading && <LoadingBubble />}
+        {isLoading && <LoadingBubble stage={loadingStage} />}
         <div ref={messagesEndRef} />
       </main>
 
@@ -331,7 +386,7 @@ function ChatBubble({ message }: { message: Message }) {
   );
 }
 
-function LoadingBubble() {
+function LoadingBubble({ stage }: { stage?: string }) {
   return (
     <div className="flex gap-4 max-w-[80%]">
       <Avatar rounded img="avatar_ai.jpg" className="mt-1 flex-shrink-0" />
@@ -339,7 +394,7 @@ function LoadingBubble() {
          <span className="text-xs text-gray-500 mb-1">Assistant is typing...</span>
          <div className="px-5 py-3 bg-white rounded-[20px] rounded-tl-none shadow-sm w-fit flex items-center gap-2">
             <Spinner size="sm" color="purple" />
-            <span className="text-xs text-gray-500">Thinking...</span>
+            <span className="text-xs text-gray-500">{stage ? `Thinking... (${stage.replace(/_/g, " ")})` : "Thinking..."}</span>
          </div>
       </div>
     </div>